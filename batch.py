@@ -0,0 +1,262 @@
+#!/usr/local/bin/python
+'''
+Solve large numbers of puzzles across a pool of worker processes.
+
+    python batch.py puzzles.txt [more.txt.gz ...] [--workers N] [--timeout SECONDS]
+
+Puzzles are streamed from the files given, or from stdin, in any format
+puzzleio reads. Each puzzle's board size goes by its length (see
+sudoku.geometry_for), so 16x16 or 25x25 puzzles can be given one per line.
+Each solution (or the puzzle's status if it wasn't solved) is written on
+its own line, in input order unless --unordered is given. A summary goes
+to stderr.
+
+With --check, puzzles are checked for a unique solution instead and each
+line of output is the puzzle's status: 'unique', 'multiple', 'unsolvable',
+'invalid', 'timeout' or 'error'.
+'''
+import argparse
+import collections
+import concurrent.futures
+import itertools
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import puzzleio
+import sudoku
+
+
+DEFAULT_CHUNKSIZE = 64
+STATUSES = ('solved', 'unique', 'multiple', 'unsolvable', 'invalid', 'timeout', 'error')
+# for worker processes started by a long-lived process: a forked worker
+# would inherit whatever files and sockets the parent has open, such as a
+# service's client connections, and keep them from closing
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def solve_one(puzzle, engine = 'propagation', rules = sudoku.DEFAULT_RULES, timeout = None):
+    '''
+    Solve a single puzzle, returning a result dict. The status is one of
+    'solved', 'unsolvable', 'invalid', 'timeout' or 'error'.
+    '''
+    t_start = time.perf_counter()
+    result = {'puzzle': puzzle, 'solution': None, 'status': 'error', 'nodes': 0}
+    try:
+        g = sudoku.Grid(rules = rules, geometry = sudoku.geometry_for(puzzle))
+        if not g.parse_grid(puzzle):
+            result['status'] = 'invalid'
+        else:
+            if timeout is not None:
+                g.deadline = t_start + timeout
+            if g.solve(engine):
+                result['status'] = 'solved'
+                result['solution'] = g.format_grid()
+            else:
+                result['status'] = 'unsolvable'
+        result['nodes'] = g.nodes
+    except sudoku.SearchTimeout:
+        result['status'] = 'timeout'
+        result['nodes'] = g.nodes
+    except Exception as e:
+        result['error'] = repr(e)
+    result['time'] = time.perf_counter() - t_start
+    return result
+
+
+def count_one(puzzle, limit = 2, rules = sudoku.DEFAULT_RULES, timeout = None):
+    '''
+    Count a puzzle's solutions up to `limit`, returning a result dict like
+    solve_one's with the count as 'solutions'. The status is one of
+    'unique', 'multiple', 'unsolvable', 'invalid', 'timeout' or 'error'.
+    '''
+    t_start = time.perf_counter()
+    result = {'puzzle': puzzle, 'solutions': 0, 'status': 'error', 'nodes': 0}
+    try:
+        g = sudoku.Grid(rules = rules, geometry = sudoku.geometry_for(puzzle))
+        if not g.parse_grid(puzzle):
+            result['status'] = 'invalid'
+        else:
+            if timeout is not None:
+                g.deadline = t_start + timeout
+            count = g.count_solutions(limit)
+            result['solutions'] = count
+            if count == 0:
+                result['status'] = 'unsolvable'
+            elif count == 1:
+                result['status'] = 'unique'
+            else:
+                result['status'] = 'multiple'
+        result['nodes'] = g.nodes
+    except sudoku.SearchTimeout:
+        result['status'] = 'timeout'
+        result['nodes'] = g.nodes
+    except Exception as e:
+        result['error'] = repr(e)
+    result['time'] = time.perf_counter() - t_start
+    return result
+
+
+def solve_chunk(chunk, engine, rules, timeout, limit = None):
+    if limit is not None:
+        return [ count_one(puzzle, limit, rules, timeout) for puzzle in chunk ]
+    return [ solve_one(puzzle, engine, rules, timeout) for puzzle in chunk ]
+
+
+def error_result(puzzle, error):
+    return {'puzzle': puzzle, 'solution': None, 'status': 'error', 'nodes': 0, 'time': 0.0, 'error': error}
+
+
+def solve_batch(puzzles, workers = None, chunksize = DEFAULT_CHUNKSIZE, ordered = True,
+        timeout = None, engine = 'propagation', rules = sudoku.DEFAULT_RULES, summary = None, limit = None):
+    '''
+    Solve an iterable of puzzles on a process pool, yielding a result dict
+    per puzzle (see solve_one) with its position in the input as 'index'.
+
+    Puzzles are read lazily and sent to the workers `chunksize` at a time,
+    with only a couple of chunks per worker in flight, so memory stays flat
+    however long the input is. Results come back in input order, or as soon
+    as each chunk finishes if `ordered` is False. `timeout` is the time
+    allowed per puzzle, after which it is reported as 'timeout'. With a
+    `limit`, solutions are counted up to it (see count_one) instead of
+    solved.
+
+    If a worker process dies, the pool is restarted and the chunks it lost
+    are rerun one at a time, so the one that kills a worker can be told
+    apart from the ones that were just in flight with it. That chunk is then
+    rerun a puzzle at a time, and only the puzzle that kills its worker is
+    reported as 'error'.
+
+    If a `summary` dict is given, it is filled in with aggregate counts, the
+    elapsed time and the puzzles solved per second once the batch finishes.
+    '''
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+    chunks = enumerate(iter(lambda it = iter(puzzles): list(itertools.islice(it, chunksize)), []))
+
+    counts = dict( (status, 0) for status in STATUSES )
+    t_start = time.perf_counter()
+
+    pool = concurrent.futures.ProcessPoolExecutor(max_workers = workers)
+    # future -> (chunk number, offset in chunk, puzzles, running on its own)
+    in_flight = {}
+    # chunk number -> its results so far, None where still to come
+    slots = {}
+    # (chunk number, offset, puzzles) lost when a worker died, to rerun alone
+    suspects = collections.deque()
+    next_chunk = 0
+    exhausted = False
+
+    def submit(number, offset, chunk, isolated):
+        future = pool.submit(solve_chunk, chunk, engine, rules, timeout, limit)
+        in_flight[future] = (number, offset, chunk, isolated)
+
+    try:
+        while True:
+            if suspects:
+                if not in_flight:
+                    number, offset, chunk = suspects.popleft()
+                    submit(number, offset, chunk, True)
+            else:
+                while not exhausted and len(in_flight) < max_in_flight:
+                    try:
+                        number, chunk = next(chunks)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    slots[number] = [None,] * len(chunk)
+                    submit(number, 0, chunk, False)
+
+            if not in_flight:
+                break
+
+            finished, _ = concurrent.futures.wait(in_flight, return_when = concurrent.futures.FIRST_COMPLETED)
+            lost = []
+            for future in finished:
+                number, offset, chunk, isolated = in_flight.pop(future)
+                try:
+                    results = future.result()
+                except BrokenProcessPool:
+                    lost.append((number, offset, chunk, isolated))
+                    continue
+                except Exception as e:
+                    results = [ error_result(p, repr(e)) for p in chunk ]
+                slots[number][offset:offset + len(chunk)] = results
+
+            if lost:
+                # the pool is unusable once a worker dies; every chunk still
+                # in flight is lost along with it
+                lost += in_flight.values()
+                in_flight.clear()
+                pool.shutdown(wait = False, cancel_futures = True)
+                pool = concurrent.futures.ProcessPoolExecutor(max_workers = workers)
+                for number, offset, chunk, isolated in lost:
+                    if not isolated:
+                        suspects.append((number, offset, chunk))
+                    elif len(chunk) > 1:
+                        # this chunk did it on its own; find the puzzle
+                        suspects.extend( (number, offset + k, [p]) for k, p in enumerate(chunk) )
+                    else:
+                        slots[number][offset] = error_result(chunk[0], 'worker process died')
+
+            if ordered:
+                ready = []
+                while next_chunk in slots and None not in slots[next_chunk]:
+                    ready.append(next_chunk)
+                    next_chunk += 1
+            else:
+                ready = [ number for number in sorted(slots) if None not in slots[number] ]
+            for number in ready:
+                for offset, result in enumerate(slots.pop(number)):
+                    result['index'] = number * chunksize + offset
+                    counts[result['status']] += 1
+                    yield result
+    finally:
+        pool.shutdown(wait = False, cancel_futures = True)
+
+        if summary is not None:
+            elapsed = time.perf_counter() - t_start
+            total = sum(counts.values())
+            summary.update(counts)
+            summary['count'] = total
+            summary['elapsed'] = elapsed
+            summary['puzzles_per_second'] = total / elapsed if elapsed else 0.0
+            summary['workers'] = workers
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Solve puzzles in parallel.')
+    parser.add_argument('files', nargs = '*', default = ['-'], help = 'puzzle files (default: stdin)')
+    parser.add_argument('--format', default = 'auto', choices = puzzleio.FORMATS, help = 'input format')
+    parser.add_argument('--mmap', action = 'store_true', help = 'read uncompressed files through mmap')
+    parser.add_argument('--output', default = '-', help = 'where to write solutions (.gz to compress)')
+    parser.add_argument('--workers', type = int, default = None, help = 'worker processes (default: all cores)')
+    parser.add_argument('--chunksize', type = int, default = DEFAULT_CHUNKSIZE, help = 'puzzles sent to a worker at once')
+    parser.add_argument('--timeout', type = float, default = None, help = 'seconds allowed per puzzle')
+    parser.add_argument('--unordered', action = 'store_true', help = 'write results as they complete')
+    parser.add_argument('--engine', default = 'propagation', choices = sudoku.ENGINE_NAMES)
+    parser.add_argument('--check', action = 'store_true', help = 'check for a unique solution instead of solving')
+    args = parser.parse_args(argv)
+
+    puzzles = puzzleio.read_corpora(args.files, args.format, args.mmap)
+
+    summary = {}
+    with puzzleio.PuzzleWriter(args.output) as writer:
+        for result in solve_batch(puzzles, workers = args.workers, chunksize = args.chunksize,
+                ordered = not args.unordered, timeout = args.timeout, engine = args.engine, summary = summary,
+                limit = 2 if args.check else None):
+            writer.write(result.get('solution') or result['status'])
+
+    good = 'unique' if args.check else 'solved'
+    sys.stderr.write("%d puzzles in %.2f s (%.1f/s) on %d workers: %d %s, %s%d unsolvable, "
+            "%d invalid, %d timed out, %d errors\n" % (
+                summary['count'], summary['elapsed'], summary['puzzles_per_second'], summary['workers'],
+                summary[good], good, '%d multiple, ' % summary['multiple'] if args.check else '',
+                summary['unsolvable'], summary['invalid'], summary['timeout'], summary['error']))
+    return 0 if summary['count'] == summary[good] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
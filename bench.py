@@ -0,0 +1,685 @@
+#!/usr/local/bin/python
+'''
+Solver benchmarks.
+
+The suite times full solves over named corpora (or puzzle files) and
+reports latency percentiles with search nodes and eliminations per puzzle:
+
+    python bench.py suite --corpus grids --corpus easy50 --json run.json
+    python bench.py suite --compare run.json    # flag regressions
+
+Micro-benchmarks for the solver internals:
+
+    python bench.py propagation
+    python bench.py search
+    python bench.py engines
+    python bench.py rules
+    python bench.py branching     # search strategies x value orders
+    python bench.py portfolio     # one puzzle at a time on every core
+    python bench.py imports       # exits 1 over the startup budgets
+    python bench.py cache
+    python bench.py vectorized    # needs numpy
+    python bench.py scaling       # 6x6 up to 25x25
+'''
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import puzzleio
+import sudoku
+
+
+EASY50 = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'easy50.txt')
+# a percentile that gets this much slower than in the baseline is a regression
+REGRESSION_THRESHOLD = 0.10
+# most a module may take to import, in seconds, with its bytecode compiled
+IMPORT_BUDGETS = {
+        'sudoku': 0.015,
+        }
+# most `python sudoku.py solve CLI_PUZZLE` may take on top of starting a
+# bare interpreter, in seconds, and how much of that may go on imports.
+# Pipelines run the command line once per puzzle.
+CLI_BUDGET = 0.060
+CLI_IMPORT_BUDGET = 0.035
+# an easy puzzle, so that the command line's own startup is what gets timed
+CLI_PUZZLE = '003020600900305001001806400008102900700000008006708200002609500800203009005010300'
+
+
+def hard_corpus(count = 10, variants = 3, seed = 0):
+    '''
+    Random symmetric variants of the puzzles in grids that need the most
+    search without higher-order propagation.
+    '''
+    import canon
+
+    nodes = []
+    for p in sudoku.grids:
+        g = sudoku.Grid(p, rules = ())
+        g.solve()
+        nodes.append((g.nodes, p))
+    hardest = [ p for _, p in sorted(nodes, reverse = True)[:count] ]
+
+    rng = random.Random(seed)
+    return [ canon.apply_transform(p, canon.random_transform(rng)) for p in hardest for _ in range(variants) ]
+
+
+CORPORA = {
+        'grids': lambda: list(sudoku.grids),
+        'easy50': lambda: list(puzzleio.read_puzzles(EASY50)),
+        'hard': hard_corpus,
+        }
+
+
+def load_corpus(name):
+    '''
+    A named corpus, or the puzzles in a file.
+    '''
+    if name in CORPORA:
+        return CORPORA[name]()
+    if os.path.exists(name):
+        return list(puzzleio.read_puzzles(name))
+    raise ValueError("Unknown corpus: %s" % name)
+
+
+def percentile(values, p):
+    '''
+    The p-th percentile of `values`, interpolating between closest ranks.
+    '''
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def bench_propagation(puzzles = None, repeat = 5):
+    '''
+    Time propagation from the givens (Grid.parse_grid() assigns each one and
+    eliminates it from its peers, then Grid.reduce() re-checks every cell) and
+    a single get_peers() lookup, reporting the best per-call cost over
+    `repeat` passes of the puzzle list.
+    '''
+    puzzles = puzzles or sudoku.grids
+
+    best_reduce = None
+    for _ in range(repeat):
+        boards = [ sudoku.Grid() for p in puzzles ]
+        t_start = time.perf_counter()
+        for g, p in zip(boards, puzzles):
+            g.parse_grid(p)
+            g.reduce()
+        delta = (time.perf_counter() - t_start) / len(boards)
+        best_reduce = delta if best_reduce is None else min(best_reduce, delta)
+
+    g = sudoku.Grid(puzzles[0])
+    calls = 100000
+    best_peers = None
+    for _ in range(repeat):
+        t_start = time.perf_counter()
+        for i in range(calls):
+            g.cells[i % 81].get_peers()
+        delta = (time.perf_counter() - t_start) / calls
+        best_peers = delta if best_peers is None else min(best_peers, delta)
+
+    print("propagate:   %8.1f us/call over %d puzzles" % (best_reduce * 1e6, len(puzzles)))
+    print("get_peers(): %8.3f us/call" % (best_peers * 1e6))
+    return {'propagate': best_reduce, 'get_peers': best_peers}
+
+
+def bench_search(puzzles = None, modes = ('copy', 'trail')):
+    '''
+    Solve every puzzle with each search mode, reporting search nodes per
+    second and the peak memory allocated while searching. Memory is measured
+    on a separate pass since tracing allocations slows everything down.
+    '''
+    puzzles = puzzles or sudoku.grids
+    results = {}
+
+    for mode in modes:
+        nodes = 0
+        elapsed = 0.0
+        solutions = []
+        for p in puzzles:
+            g = sudoku.Grid(p)
+            t_start = time.perf_counter()
+            g.search(mode = mode)
+            elapsed += time.perf_counter() - t_start
+            nodes += g.nodes
+            solutions.append(tuple(g.board.masks))
+
+        peak = 0
+        for p in puzzles:
+            g = sudoku.Grid(p)
+            tracemalloc.start()
+            g.search(mode = mode)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+        results[mode] = {'nodes': nodes, 'time': elapsed, 'peak': peak, 'solutions': solutions}
+        print("%-6s %8d nodes in %7.3f s = %9.0f nodes/s, peak %8.1f KB" % (
+            mode, nodes, elapsed, nodes / elapsed, peak / 1024.0))
+
+    if len(set( tuple(r['solutions']) for r in results.values() )) > 1:
+        print("WARNING: search modes disagree on the solutions")
+    return results
+
+
+def bench_engines(puzzles = None, engines = sudoku.ENGINE_NAMES):
+    '''
+    Solve every puzzle with each engine, reporting mean and worst latency, and
+    cross-check that all engines agree on every solution.
+    '''
+    puzzles = puzzles or sudoku.grids
+    results = {}
+
+    for engine in engines:
+        times = []
+        solutions = []
+        for p in puzzles:
+            g = sudoku.Grid(p)
+            t_start = time.perf_counter()
+            solved = g.solve(engine)
+            times.append(time.perf_counter() - t_start)
+            solutions.append(tuple(g.board.masks) if solved and g.is_solved() else None)
+
+        results[engine] = {'times': times, 'solutions': solutions}
+        print("%-12s mean %8.2f ms, max %8.2f ms, %d/%d solved" % (
+            engine, 1000 * sum(times) / len(times), 1000 * max(times),
+            len([ s for s in solutions if s ]), len(puzzles)))
+
+    mismatches = [ i for i in range(len(puzzles))
+            if len(set( r['solutions'][i] for r in results.values() )) > 1 ]
+    for i in mismatches:
+        print("MISMATCH: engines disagree on puzzle %d" % i)
+    return results
+
+
+def bench_rules(corpora = None, rules = sudoku.RULE_ORDER):
+    '''
+    For each puzzle, count search nodes with no propagation rules and with
+    each rule enabled on its own; the difference is the number of branches
+    that rule saved. Totals and solve time per rule show whether it pays for
+    its cost.
+    '''
+    if corpora is None:
+        corpora = {'grids': sudoku.grids, 'easy50': list(puzzleio.read_puzzles(EASY50))}
+    configs = [ ('none', ()) ] + [ (name, (name,)) for name in rules ] + [ ('all', tuple(rules)) ]
+    results = {}
+
+    for corpus, puzzles in sorted(corpora.items()):
+        print("-- %s: branches saved per rule (baseline = nodes with no rules)" % corpus)
+        print("%6s %9s " % ('puzzle', 'baseline') + ' '.join( '%14s' % name for name, _ in configs[1:] ))
+        nodes = dict( (name, []) for name, _ in configs )
+        times = dict( (name, 0.0) for name, _ in configs )
+
+        for p in puzzles:
+            for name, config in configs:
+                g = sudoku.Grid(p, rules = config)
+                t_start = time.perf_counter()
+                g.solve()
+                times[name] += time.perf_counter() - t_start
+                nodes[name].append(g.nodes)
+
+            i = len(nodes['none']) - 1
+            base = nodes['none'][i]
+            print("%6d %9d " % (i, base) + ' '.join( '%14d' % (base - nodes[name][i]) for name, _ in configs[1:] ))
+
+        base = sum(nodes['none'])
+        print("%6s %9d " % ('total', base) + ' '.join( '%14d' % (base - sum(nodes[name])) for name, _ in configs[1:] ))
+        print("%6s %8.2fs " % ('time', times['none']) + ' '.join( '%13.2fs' % times[name] for name, _ in configs[1:] ))
+        results[corpus] = {'nodes': nodes, 'times': times}
+    return results
+
+
+def bench_branching(puzzles = None, strategies = tuple(sudoku.BRANCHING), orders = tuple(sudoku.VALUE_ORDERS),
+        repeat = 3):
+    '''
+    Solve every puzzle with each combination of branching strategy and
+    value ordering, reporting the search nodes expanded and the best total
+    time of `repeat` runs. 'random' ordering is seeded, so node counts are
+    the same from run to run.
+    '''
+    puzzles = puzzles or sudoku.grids
+    results = {}
+    print("%-12s %-8s %8s %9s %9s" % ('branching', 'order', 'nodes', 'time s', 'max ms'))
+
+    for strategy in strategies:
+        for order in orders:
+            best = None
+            for _ in range(repeat):
+                nodes = 0
+                times = []
+                for p in puzzles:
+                    g = sudoku.Grid(p, branching = strategy, value_order = order, seed = 0)
+                    t_start = time.perf_counter()
+                    if not g.solve():
+                        print("FAILED: %s/%s on %s" % (strategy, order, p))
+                    times.append(time.perf_counter() - t_start)
+                    nodes += g.nodes
+                if best is None or sum(times) < sum(best):
+                    best = times
+            results[(strategy, order)] = {'nodes': nodes, 'time': sum(best), 'max': max(best)}
+            print("%-12s %-8s %8d %9.3f %9.2f" % (strategy, order, nodes, sum(best), 1000 * max(best)))
+
+    fastest = min(results, key = lambda key: results[key]['time'])
+    print("fastest: %s/%s" % fastest)
+    return results
+
+
+def bench_portfolio(puzzles = None, workers = None):
+    '''
+    Solve hard puzzles one at a time, in this process and then with a
+    Portfolio in each mode, reporting mean and worst latency. The pool is
+    started before timing.
+    '''
+    import portfolio
+
+    puzzles = puzzles or hard_corpus()
+    results = {}
+
+    def run(name, solve):
+        times = []
+        for p in puzzles:
+            t_start = time.perf_counter()
+            g = solve(p)
+            times.append(time.perf_counter() - t_start)
+            if g is None or not g.is_solved():
+                print("FAILED: %s on %s" % (name, p))
+        results[name] = times
+        print("%-12s mean %8.2f ms, max %8.2f ms" % (name, 1000 * sum(times) / len(times), 1000 * max(times)))
+
+    def solve_here(p):
+        g = sudoku.Grid(p)
+        return g if g.solve() else None
+
+    run('sequential', solve_here)
+    with portfolio.Portfolio(workers) as pool:
+        pool.solve(puzzles[0])
+        for mode in portfolio.MODES:
+            run(mode, lambda p: pool.solve(p, mode = mode))
+    return results
+
+
+def compile_tree():
+    '''
+    Compile the bytecode of every module here, as installing them would, so
+    that startup timings don't include compiling them from source.
+    '''
+    import compileall
+    compileall.compile_dir(os.path.dirname(os.path.abspath(__file__)), maxlevels = 0, quiet = 1)
+
+
+def run_python(args, importtime = False):
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + list(args)
+    return subprocess.run(command, cwd = os.path.dirname(os.path.abspath(__file__)),
+            capture_output = True, text = True, check = True)
+
+
+def import_times(args):
+    '''
+    Run a fresh interpreter with -X importtime and `args`, and return
+    (name, depth, seconds) for every module imported, where depth 0 is a
+    module imported by the code run rather than by another module, and
+    seconds include everything that module imported.
+    '''
+    times = []
+    for line in run_python(args, importtime = True).stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                depth = (len(name) - len(name.lstrip()) - 1) // 2
+                times.append((name.strip(), depth, int(cumulative) / 1e6))
+    return times
+
+
+def import_time(module, repeat = 5):
+    '''
+    The best of `repeat` imports of `module` in fresh interpreters, in
+    seconds.
+    '''
+    return min( t for _ in range(repeat) for name, depth, t in import_times(['-c', 'import %s' % module])
+            if name == module and depth == 0 )
+
+
+def cli_import_time(repeat = 5):
+    '''
+    The best of `repeat` runs of the time `sudoku.py solve` spends importing
+    modules the bare interpreter doesn't, in seconds.
+    '''
+    startup = set( name for name, _, _ in import_times(['-c', 'pass']) )
+    return min( sum( t for name, depth, t in import_times(['sudoku.py', 'solve', CLI_PUZZLE])
+            if depth == 0 and name not in startup ) for _ in range(repeat) )
+
+
+def cli_time(repeat = 5):
+    '''
+    How much longer `sudoku.py solve` takes to run than a bare interpreter,
+    best of `repeat` runs each, in seconds. Unlike import times this
+    includes compiling sudoku.py, which as a script is never cached.
+    '''
+    def best(args):
+        times = []
+        for _ in range(repeat):
+            t_start = time.perf_counter()
+            run_python(args)
+            times.append(time.perf_counter() - t_start)
+        return min(times)
+    return best(['sudoku.py', 'solve', CLI_PUZZLE]) - best(['-c', 'pass'])
+
+
+def bench_imports(budgets = IMPORT_BUDGETS, repeat = 5):
+    '''
+    Time importing each module of `budgets`, and running `sudoku.py solve`
+    on an easy puzzle, against their budgets. Returns what went over.
+    '''
+    compile_tree()
+    over = []
+    results = [ ('import %s' % module, import_time(module, repeat), budgets[module]) for module in sorted(budgets) ]
+    results.append(('sudoku.py solve imports', cli_import_time(repeat), CLI_IMPORT_BUDGET))
+    results.append(('sudoku.py solve', cli_time(repeat), CLI_BUDGET))
+    for name, t, budget in results:
+        print("%-24s %7.2f ms (budget %.0f ms)" % (name, 1000 * t, 1000 * budget))
+        if t > budget:
+            print("OVER BUDGET: %s" % name)
+            over.append(name)
+    return over
+
+
+def bench_cache(puzzles = None, variants = 5, seed = 0):
+    '''
+    Solve `variants` random relabelings/permutations of every puzzle, first
+    directly and then through a canonical-form SolutionCache, reporting hit
+    rate and lookup latency.
+    '''
+    import canon
+
+    puzzles = puzzles or sudoku.grids
+    rng = random.Random(seed)
+    workload = [ canon.apply_transform(p, canon.random_transform(rng)) for p in puzzles for _ in range(variants) ]
+    rng.shuffle(workload)
+
+    results = {}
+    for name, engine in (('direct', 'propagation'), ('cached', canon.SolutionCache(maxsize = len(workload)))):
+        t_start = time.perf_counter()
+        for p in workload:
+            g = sudoku.Grid(p)
+            g.solve(engine)
+        results[name] = time.perf_counter() - t_start
+        print("%-6s %8.3f s for %d puzzles" % (name, results[name], len(workload)))
+
+    stats = engine.stats()
+    print("hit rate %.1f%% (%d hits, %d misses), mean lookup %.2f ms" % (
+        100 * stats['hit_rate'], stats['hits'], stats['misses'], 1000 * stats['mean_lookup_time']))
+    results['stats'] = stats
+    return results
+
+
+def bench_vectorized(puzzles = None, copies = 200):
+    '''
+    Solve `copies` copies of a corpus one Grid at a time and as one NumPy
+    batch, reporting puzzles per second for each.
+    '''
+    import vectorized
+
+    puzzles = (puzzles or list(puzzleio.read_puzzles(EASY50))) * copies
+    results = {}
+
+    t_start = time.perf_counter()
+    for p in puzzles:
+        sudoku.Grid(p).solve()
+    results['scalar'] = len(puzzles) / (time.perf_counter() - t_start)
+
+    stats = {}
+    t_start = time.perf_counter()
+    vectorized.solve_batch(puzzles, stats = stats)
+    results['vectorized'] = len(puzzles) / (time.perf_counter() - t_start)
+
+    for name in ('scalar', 'vectorized'):
+        print("%-10s %8.0f puzzles/s" % (name, results[name]))
+    print("%d puzzles: %d by propagation, %d by branching, %d by search" % (
+        len(puzzles), stats['propagated'], stats['branched'], stats['searched']))
+    results['stats'] = stats
+    return results
+
+
+SCALING_GEOMETRIES = ((2, 3), (3, 3), (4, 4), (5, 5))
+
+
+def scaled_puzzles(geometry, count = 10, blanks = 0.5, seed = 0):
+    '''
+    Puzzles for any board geometry: a patterned solution shuffled by random
+    band, row, stack, column and value permutations, with a fraction
+    `blanks` of its cells emptied. They may have more than one solution.
+    '''
+    n = geometry.size
+    box_rows = geometry.box_rows
+    box_cols = geometry.box_cols
+    rng = random.Random(seed)
+
+    puzzles = []
+    for _ in range(count):
+        rows = [ band * box_rows + r for band in rng.sample(range(n // box_rows), n // box_rows)
+                for r in rng.sample(range(box_rows), box_rows) ]
+        cols = [ stack * box_cols + c for stack in rng.sample(range(n // box_cols), n // box_cols)
+                for c in rng.sample(range(box_cols), box_cols) ]
+        symbols = rng.sample(geometry.symbols, n)
+        puzzles.append(''.join(
+                '.' if rng.random() < blanks else symbols[(box_cols * (r % box_rows) + r // box_rows + c) % n]
+                for r in rows for c in cols ))
+    return puzzles
+
+
+def bench_scaling(geometries = SCALING_GEOMETRIES, count = 10, blanks = 0.4):
+    '''
+    Time the propagation engine on boards from 6x6 to 25x25, each with the
+    same fraction of cells blank, along with building each geometry's
+    tables.
+    '''
+    print("%-7s %6s %10s %10s %10s %10s" % ('board', 'cells', 'tables ms', 'mean ms', 'us/cell', 'nodes'))
+    results = {}
+    for box_rows, box_cols in geometries:
+        t_start = time.perf_counter()
+        geometry = sudoku.Geometry(box_rows, box_cols)
+        tables = time.perf_counter() - t_start
+
+        times = []
+        nodes = 0
+        for p in scaled_puzzles(geometry, count, blanks):
+            g = sudoku.Grid(geometry = geometry)
+            t_start = time.perf_counter()
+            g.parse_grid(p)
+            g.solve()
+            times.append(time.perf_counter() - t_start)
+            nodes += g.nodes
+
+        name = '%dx%d' % (geometry.size, geometry.size)
+        mean = sum(times) / len(times)
+        results[name] = {'cells': geometry.cell_count, 'tables': tables, 'mean': mean, 'nodes': nodes}
+        print("%-7s %6d %10.1f %10.2f %10.2f %10d" % (name, geometry.cell_count, tables * 1000, mean * 1000,
+            mean * 1e6 / geometry.cell_count, nodes))
+    return results
+
+
+def solve_timed(puzzle, engine, rules):
+    '''
+    Solve a puzzle once, returning its result, or None if it doesn't parse
+    (malformed, or with conflicting givens).
+    '''
+    g = sudoku.Grid(rules = rules, geometry = sudoku.geometry_for(puzzle))
+    if not g.parse_grid(puzzle):
+        return None
+    solved = g.solve(engine)
+    return {'solved': bool(solved and g.is_solved()), 'time': g.stats.time, 'nodes': g.stats.branches,
+            'eliminations': g.stats.eliminations}
+
+
+def run_corpus(puzzles, engine = 'propagation', rules = sudoku.DEFAULT_RULES, warmup = 1, repeat = 5):
+    '''
+    Solve every puzzle `warmup` times untimed, then `repeat` times timed.
+    Each puzzle's time is the median of its timed runs. Returns the
+    per-puzzle results and a summary with latency percentiles. A puzzle that
+    doesn't parse counts as unsolved and is left out of the times.
+    '''
+    for _ in range(warmup):
+        for p in puzzles:
+            solve_timed(p, engine, rules)
+
+    per_puzzle = []
+    for p in puzzles:
+        if solve_timed(p, engine, rules) is None:
+            per_puzzle.append({'puzzle': p, 'solved': False, 'time': None, 'min_time': None, 'nodes': 0,
+                'eliminations': 0})
+            continue
+        runs = [ solve_timed(p, engine, rules) for _ in range(repeat) ]
+        times = [ r['time'] for r in runs ]
+        per_puzzle.append({'puzzle': p, 'solved': runs[0]['solved'], 'time': percentile(times, 50),
+            'min_time': min(times), 'nodes': runs[0]['nodes'], 'eliminations': runs[0]['eliminations']})
+
+    times = [ r['time'] for r in per_puzzle if r['time'] is not None ]
+    summary = {
+            'count': len(per_puzzle),
+            'solved': len([ r for r in per_puzzle if r['solved'] ]),
+            'invalid': len(per_puzzle) - len(times),
+            'total': sum(times),
+            'mean': sum(times) / len(times) if times else 0.0,
+            'p50': percentile(times, 50),
+            'p95': percentile(times, 95),
+            'p99': percentile(times, 99),
+            'max': max(times) if times else 0.0,
+            'nodes': sum( r['nodes'] for r in per_puzzle ),
+            'eliminations': sum( r['eliminations'] for r in per_puzzle ),
+            }
+    return {'summary': summary, 'puzzles': per_puzzle}
+
+
+def run_suite(corpora = ('grids', 'easy50', 'hard'), engine = 'propagation', rules = sudoku.DEFAULT_RULES,
+        warmup = 1, repeat = 5):
+    '''
+    Benchmark each corpus, returning a JSON-serialisable report.
+    '''
+    report = {
+            'created': datetime.datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'engine': engine if isinstance(engine, str) else engine.name,
+            'rules': list(rules),
+            'warmup': warmup,
+            'repeat': repeat,
+            'corpora': {},
+            }
+    for name in corpora:
+        report['corpora'][name] = run_corpus(load_corpus(name), engine, rules, warmup, repeat)
+    return report
+
+
+def print_report(report):
+    print("%-10s %6s %6s %9s %9s %9s %9s %9s %10s %12s" % (
+        'corpus', 'count', 'solved', 'mean ms', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms', 'nodes', 'eliminations'))
+    for name, result in report['corpora'].items():
+        s = result['summary']
+        print("%-10s %6d %6d %9.3f %9.3f %9.3f %9.3f %9.3f %10d %12d" % (
+            name, s['count'], s['solved'], 1000 * s['mean'], 1000 * s['p50'], 1000 * s['p95'],
+            1000 * s['p99'], 1000 * s['max'], s['nodes'], s['eliminations']))
+
+
+def compare_reports(baseline, report, threshold = REGRESSION_THRESHOLD):
+    '''
+    Print how each corpus summary changed against a baseline report and
+    return the list of (corpus, metric) pairs that got slower by more than
+    `threshold`, or that solve fewer puzzles.
+    '''
+    regressions = []
+    for name, result in report['corpora'].items():
+        if name not in baseline['corpora']:
+            continue
+        old = baseline['corpora'][name]['summary']
+        new = result['summary']
+        changes = []
+        for metric in ('mean', 'p50', 'p95', 'p99', 'nodes'):
+            if not old[metric]:
+                continue
+            change = (new[metric] - old[metric]) / float(old[metric])
+            changes.append("%s %+.1f%%" % (metric, 100 * change))
+            if change > threshold:
+                regressions.append((name, metric))
+        if new['solved'] < old['solved']:
+            regressions.append((name, 'solved'))
+        print("%-10s %s" % (name, ', '.join(changes)))
+
+    for name, metric in regressions:
+        print("REGRESSION: %s %s" % (name, metric))
+    return regressions
+
+
+def bench_suite(args = None):
+    args = args or parse_args(['suite'])
+    report = run_suite(args.corpus or ('grids', 'easy50', 'hard'), args.engine, args.rules,
+            args.warmup, args.repeat)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent = 1)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare_reports(baseline, report):
+            return 1
+    return 0
+
+
+BENCHMARKS = {
+        'propagation': bench_propagation,
+        'search': bench_search,
+        'engines': bench_engines,
+        'rules': bench_rules,
+        'branching': bench_branching,
+        'portfolio': bench_portfolio,
+        'imports': bench_imports,
+        'cache': bench_cache,
+        'vectorized': bench_vectorized,
+        'scaling': bench_scaling,
+        }
+
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description = 'Solver benchmarks.')
+    parser.add_argument('benchmarks', nargs = '*', default = ['suite'],
+            choices = ['suite'] + sorted(BENCHMARKS), help = 'what to run (default: suite)')
+    parser.add_argument('--corpus', action = 'append',
+            help = 'corpus for the suite: %s or a puzzle file (repeatable)' % ', '.join(sorted(CORPORA)))
+    parser.add_argument('--engine', default = 'propagation', choices = sudoku.ENGINE_NAMES)
+    parser.add_argument('--rules', type = lambda s: tuple( r for r in s.split(',') if r ),
+            default = sudoku.DEFAULT_RULES, help = 'comma separated propagation rules')
+    parser.add_argument('--warmup', type = int, default = 1, help = 'untimed passes over each corpus')
+    parser.add_argument('--repeat', type = int, default = 5, help = 'timed runs per puzzle')
+    parser.add_argument('--json', help = 'write the suite report here')
+    parser.add_argument('--compare', help = 'baseline suite report to check for regressions')
+    return parser.parse_args(argv)
+
+
+def main(argv = None):
+    args = parse_args(argv)
+    status = 0
+    for name in args.benchmarks:
+        print("== %s" % name)
+        if name == 'suite':
+            status = bench_suite(args) or status
+        elif name == 'imports':
+            status = 1 if bench_imports() else status
+        else:
+            BENCHMARKS[name]()
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
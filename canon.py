@@ -0,0 +1,351 @@
+'''
+Canonical forms for Sudoku puzzles, and a solution cache keyed on them.
+
+Relabelling the digits, transposing, permuting the bands (and the rows
+within each band) and permuting the stacks (and the columns within each
+stack) all turn a puzzle into an equivalent one whose solution is the same
+transform of the original solution. The canonical form of a puzzle is the
+lexicographically smallest string it can be turned into this way, with
+empty cells as '0'. Equivalent puzzles share a canonical form, so one
+cached solution answers all of them.
+
+The minimum is found one output row at a time, keeping every partial
+transform that ties for the smallest prefix. Columns that have been empty in
+every row so far are interchangeable, so instead of enumerating column
+orders each partial transform keeps an ordered partition of the columns
+(stacks, then groups of still-interchangeable columns within each stack)
+that every new row refines.
+
+Nearly full rows can still tie in thousands of ways, one for every order of
+their columns, and the ties multiply from row to row. Past MAX_TIES partial
+transforms canonicalize() gives up with a ValueError, and SolutionCache
+solves such a puzzle directly without caching it.
+'''
+import collections
+import itertools
+import os
+import time
+
+import sudoku
+from sudoku import BIT, UNITS
+
+
+Transform = collections.namedtuple('Transform', 'transpose rows cols relabel')
+Transform.__doc__ = '''
+A symmetry of the puzzle: output cell (r, c) is source cell (rows[r],
+cols[c]) of the (optionally transposed) puzzle, with digit d written as
+relabel[d]. relabel[0] is 0.
+'''
+
+# sorts after any real label, in order of appearance within a stack
+NEW = 100
+# partial transforms allowed to tie for the smallest prefix; the puzzles in
+# sudoku.grids never need more than a dozen
+MAX_TIES = 1000
+
+
+def to_values(puzzle):
+    values = []
+    for c in puzzle:
+        if c in '123456789':
+            values.append(int(c))
+        elif c in '.0':
+            values.append(0)
+        else:
+            raise ValueError("Invalid grid character: %c" % c)
+    if len(values) != 81:
+        raise ValueError("Invalid grid (length %d)" % len(values))
+
+    for unit in UNITS:
+        seen = 0
+        for i in unit:
+            if values[i]:
+                if seen & BIT[values[i]]:
+                    raise ValueError("Puzzle repeats a value in a unit")
+                seen |= BIT[values[i]]
+    return values
+
+
+def arrange_row(structure, row, labels):
+    '''
+    Order the columns to make `row` as small as possible within what the
+    column partition still allows. Yields (key, structure, labels) for each
+    way of doing it; they all share the same key (the row as written), but
+    differ in which new digit got which label or in the refined partition.
+    '''
+    def key(col):
+        v = row[col]
+        if not v:
+            return 0
+        return labels.get(v, NEW)
+
+    # for each stack group: (stack key, column parts, number of new digits)
+    # for every stack in it, smallest key first
+    group_options = []
+    for stack_group in structure:
+        stacks = []
+        for stack in stack_group:
+            # per column group: subgroups of zero/labelled columns plus the
+            # new-digit columns, whose relative order is a free choice
+            parts = []
+            stack_key = []
+            new_count = 0
+            for column_group in stack:
+                zeros = [ c for c in column_group if not row[c] ]
+                labelled = sorted( (c for c in column_group if row[c] and row[c] in labels), key = key )
+                new = [ c for c in column_group if row[c] and row[c] not in labels ]
+                parts.append((zeros, labelled, new))
+                stack_key += [0,] * len(zeros) + [ key(c) for c in labelled ]
+                stack_key += [ NEW + new_count + j for j in range(len(new)) ]
+                new_count += len(new)
+            stacks.append((tuple(stack_key), parts, new_count))
+        stacks.sort(key = lambda s: s[0])
+        group_options.append(stacks)
+
+    # stacks with equal keys stay interchangeable unless they hold new
+    # digits, in which case their order decides the labels and is a choice
+    group_choices = []
+    for stacks in group_options:
+        runs = [ list(run) for _, run in itertools.groupby(stacks, key = lambda s: s[0]) ]
+        choices = []
+        for run in runs:
+            if run[0][2]:
+                choices.append([ [ [s] for s in perm ] for perm in itertools.permutations(run) ])
+            else:
+                choices.append([ [run] ])
+        group_choices.append(choices)
+
+    flat_choices = [ choice for choices in group_choices for choice in choices ]
+    for selection in itertools.product(*flat_choices):
+        # the new structure, with the runs expanded into stack groups
+        stack_groups = [ group for run in selection for group in run ]
+        for column_orders in itertools.product(*[ new_orders(stack_group[0]) for stack_group in stack_groups ]):
+            new_labels = dict(labels)
+            out_key = []
+            new_structure = []
+            for stack_group, orders in zip(stack_groups, column_orders):
+                new_group = []
+                for stack_key, parts, _ in stack_group:
+                    new_stack = []
+                    for (zeros, labelled, new), new_order in zip(parts, orders):
+                        if zeros:
+                            new_stack.append(zeros)
+                        new_stack += [ [c] for c in labelled ]
+                        new_stack += [ [c] for c in new_order ]
+                    new_group.append(new_stack)
+                # interchangeable stacks all have the same key; write it once per stack
+                for stack in new_group:
+                    for column_group in stack:
+                        for c in column_group:
+                            v = row[c]
+                            if v and v not in new_labels:
+                                new_labels[v] = len(new_labels) + 1
+                            out_key.append(new_labels[v] if v else 0)
+                new_structure.append(new_group)
+            yield tuple(out_key), new_structure, new_labels
+
+
+def new_orders(stack_entry):
+    '''
+    Every combination of orderings of the new-digit columns in each column
+    group of a stack.
+    '''
+    _, parts, _ = stack_entry
+    return list(itertools.product(*[ list(itertools.permutations(new)) for _, _, new in parts ]))
+
+
+def canonicalize(puzzle):
+    '''
+    Return (canonical puzzle string, Transform) such that
+    apply_transform(puzzle, transform) == canonical. Raises ValueError for an
+    invalid puzzle or one with more than MAX_TIES tied partial transforms.
+    '''
+    values = to_values(puzzle)
+    transposed = [ values[(i % 9) * 9 + i // 9] for i in range(81) ]
+    sources = (values, transposed)
+
+    initial_structure = [ [ [ [s * 3, s * 3 + 1, s * 3 + 2] ] for s in range(3) ] ]
+    # (transpose, rows chosen so far, column partition, labels)
+    states = [ (t, (), initial_structure, {}) for t in (0, 1) ]
+
+    for level in range(9):
+        best = None
+        next_states = []
+        for t, rows, structure, labels in states:
+            if level % 3:
+                band = rows[-1] // 3
+                candidates = [ r for r in range(band * 3, band * 3 + 3) if r not in rows ]
+            else:
+                used = set( r // 3 for r in rows )
+                candidates = [ r for r in range(9) if r // 3 not in used ]
+
+            for r in candidates:
+                row = sources[t][r * 9:r * 9 + 9]
+                for key, new_structure, new_labels in arrange_row(structure, row, labels):
+                    if best is not None and key > best:
+                        # every arrangement of the row has the same key
+                        break
+                    if best is None or key < best:
+                        best = key
+                        next_states = []
+                    next_states.append((t, rows + (r,), new_structure, new_labels))
+                    if len(next_states) > MAX_TIES:
+                        raise ValueError("Too many symmetric ties to canonicalize")
+        states = next_states
+
+    # any survivor gives the same string; take the first
+    t, rows, structure, labels = states[0]
+    cols = tuple( c for group in structure for stack in group for column_group in stack for c in column_group )
+    relabel = [0,] * 10
+    for digit, label in labels.items():
+        relabel[digit] = label
+    # digits that never appear still need distinct labels for the solution
+    spare = iter(sorted( set(range(1, 10)) - set(labels.values()) ))
+    for digit in range(1, 10):
+        if not relabel[digit]:
+            relabel[digit] = next(spare)
+
+    transform = Transform(bool(t), rows, cols, tuple(relabel))
+    return apply_transform(puzzle, transform), transform
+
+
+def random_transform(rng):
+    '''
+    A random symmetry, for producing equivalent puzzles from `rng` (a
+    random.Random).
+    '''
+    rows = tuple( band * 3 + r for band in rng.sample(range(3), 3) for r in rng.sample(range(3), 3) )
+    cols = tuple( stack * 3 + c for stack in rng.sample(range(3), 3) for c in rng.sample(range(3), 3) )
+    relabel = (0,) + tuple(rng.sample(range(1, 10), 9))
+    return Transform(rng.random() < 0.5, rows, cols, relabel)
+
+
+def apply_transform(puzzle, transform):
+    values = to_values(puzzle) if len(puzzle) == 81 else puzzle
+    out = []
+    for r in transform.rows:
+        for c in transform.cols:
+            i = c * 9 + r if transform.transpose else r * 9 + c
+            out.append(str(transform.relabel[values[i]]))
+    return ''.join(out)
+
+
+def invert_transform(canonical, transform):
+    '''
+    Map a grid in canonical coordinates (e.g. the canonical puzzle's solution)
+    back to the coordinates and digits of the original puzzle.
+    '''
+    unlabel = [0,] * 10
+    for digit, label in enumerate(transform.relabel):
+        unlabel[label] = digit
+
+    out = ['0',] * 81
+    for r, source_row in enumerate(transform.rows):
+        for c, source_col in enumerate(transform.cols):
+            v = canonical[r * 9 + c]
+            v = unlabel[int(v)] if v in '123456789' else 0
+            i = source_col * 9 + source_row if transform.transpose else source_row * 9 + source_col
+            out[i] = str(v)
+    return ''.join(out)
+
+
+class SolutionCache:
+    '''
+    An LRU cache of solutions keyed by canonical form, usable as a solving
+    engine in front of another one:
+
+        cache = SolutionCache(maxsize = 100000, path = 'solutions.cache')
+        grid.solve(engine = cache)
+
+    Up to `maxsize` canonical puzzles are kept, least recently used dropped
+    first. With a `path`, entries are loaded from it on creation and written
+    back by save(). Counters: hits, misses, lookups (uncacheable grids are
+    counted as misses) and lookup_time, the total seconds spent
+    canonicalizing and looking up.
+    '''
+    name = 'cache'
+
+    def __init__(self, maxsize = 10000, engine = 'propagation', path = None):
+        self.maxsize = maxsize
+        self.engine = engine
+        self.path = path
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lookup_time = 0.0
+        if path and os.path.exists(path):
+            self.load(path)
+
+    @property
+    def lookups(self):
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    @property
+    def mean_lookup_time(self):
+        return self.lookup_time / self.lookups if self.lookups else 0.0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate,
+                'size': len(self.entries), 'mean_lookup_time': self.mean_lookup_time}
+
+    def get(self, canonical):
+        solution = self.entries.get(canonical)
+        if solution is not None:
+            self.entries.move_to_end(canonical)
+        return solution
+
+    def put(self, canonical, solution):
+        self.entries[canonical] = solution
+        self.entries.move_to_end(canonical)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last = False)
+
+    def solve(self, grid):
+        # key on the givens rather than the propagated board: fewer filled
+        # cells means far fewer ties to work through when canonicalizing
+        t_start = time.perf_counter()
+        try:
+            canonical, transform = canonicalize(grid.puzzle or grid.format_grid())
+        except ValueError:
+            # conflicting givens, or too symmetric to canonicalize cheaply;
+            # nothing to cache, let the engine solve it
+            canonical = None
+        solution = canonical and self.get(canonical)
+        self.lookup_time += time.perf_counter() - t_start
+
+        if solution is not None:
+            solution = invert_transform(solution, transform)
+            masks = grid.board.masks
+            # the grid may have been narrowed down since it was parsed; only
+            # use the cached solution if it still fits
+            if all( masks[i] & BIT[int(c)] for i, c in enumerate(solution) ):
+                self.hits += 1
+                for i, c in enumerate(solution):
+                    masks[i] = BIT[int(c)]
+                return True
+
+        self.misses += 1
+        if not sudoku.get_engine(self.engine).solve(grid):
+            return False
+        if canonical is not None:
+            self.put(canonical, apply_transform(grid.format_grid(), transform))
+        return True
+
+    def load(self, path):
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2:
+                    self.put(parts[0], parts[1])
+
+    def save(self, path = None):
+        path = path or self.path
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            for canonical, solution in self.entries.items():
+                f.write("%s %s\n" % (canonical, solution))
+        os.replace(tmp, path)
@@ -0,0 +1,129 @@
+'''
+The sudoku.py command line:
+
+    python sudoku.py solve PUZZLE [...] [--engine dlx] [--profile]
+    python sudoku.py check PUZZLE [...]        # unique, multiple, unsolvable or invalid
+    python sudoku.py batch puzzles.txt [...]   # see batch.py
+    python sudoku.py bench [...]               # see bench.py
+
+Puzzles are read from stdin when none are given. Run with no command, it
+benchmarks the solver on the built-in grids as it always has. The command
+line parser and anything a command needs beyond the solver are imported by
+that command.
+'''
+import sys
+import time
+
+import sudoku
+
+
+# commands that hand the rest of the command line to another module's main()
+DELEGATED = {
+        'batch': 'solve puzzle files across worker processes',
+        'bench': 'run the benchmarks',
+        }
+
+
+def read_input(puzzles):
+    if puzzles:
+        return puzzles
+    import puzzleio
+    return puzzleio.read_puzzles('-')
+
+
+def rule_names(text):
+    '''
+    Parse a --rules value: comma separated names from sudoku.RULES.
+    '''
+    names = tuple( r for r in text.split(',') if r )
+    unknown = [ r for r in names if r not in sudoku.RULES ]
+    if unknown:
+        import argparse
+        raise argparse.ArgumentTypeError("unknown rules: %s (choose from %s)" % (
+            ', '.join(unknown), ', '.join(sudoku.RULE_ORDER)))
+    return names
+
+
+def solve_command(args):
+    status = 0
+    for puzzle in read_input(args.puzzles):
+        g = sudoku.Grid(rules = args.rules, geometry = sudoku.geometry_for(puzzle))
+        if not g.parse_grid(puzzle):
+            print('invalid')
+            status = 1
+            continue
+        if args.timeout is not None:
+            g.deadline = time.perf_counter() + args.timeout
+        try:
+            solved = g.solve(args.engine, profile = args.profile)
+        except sudoku.SearchTimeout:
+            print('timeout')
+            status = 1
+            continue
+        except ValueError as e:
+            # e.g. an engine that doesn't handle this board size
+            print('error')
+            sys.stderr.write("error: %s\n" % e)
+            status = 1
+            continue
+        print(g.format_grid() if solved else 'unsolvable')
+        if not solved:
+            status = 1
+        if args.profile:
+            import pstats
+            pstats.Stats(g.stats.profile, stream = sys.stderr).sort_stats('cumulative').print_stats(args.profile)
+    return status
+
+
+def check_command(args):
+    status = 0
+    for puzzle in read_input(args.puzzles):
+        g = sudoku.Grid(rules = args.rules, geometry = sudoku.geometry_for(puzzle))
+        if not g.parse_grid(puzzle):
+            result = 'invalid'
+        else:
+            if args.timeout is not None:
+                g.deadline = time.perf_counter() + args.timeout
+            try:
+                result = ('unsolvable', 'unique', 'multiple')[g.count_solutions(2)]
+            except sudoku.SearchTimeout:
+                result = 'timeout'
+            except ValueError as e:
+                result = 'error'
+                sys.stderr.write("error: %s\n" % e)
+        print(result)
+        if result != 'unique':
+            status = 1
+    return status
+
+
+def main(argv = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        return sudoku.solve_all()
+    if argv[0] in DELEGATED:
+        import importlib
+        return importlib.import_module(argv[0]).main(argv[1:])
+
+    import argparse
+    parser = argparse.ArgumentParser(description = 'Sudoku solver.')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+    for name, help in DELEGATED.items():
+        commands.add_parser(name, help = help + ' (see %s.py --help)' % name, add_help = False)
+    for name, help in (('solve', 'solve puzzles, printing each solution or status'),
+            ('check', 'print whether each puzzle has a unique solution')):
+        command = commands.add_parser(name, help = help)
+        command.add_argument('puzzles', nargs = '*', help = 'puzzles, one string each (default: read stdin)')
+        command.add_argument('--rules', type = rule_names,
+                default = sudoku.DEFAULT_RULES, help = 'comma separated propagation rules')
+        command.add_argument('--timeout', type = float, default = None, help = 'seconds allowed per puzzle')
+    solve = commands.choices['solve']
+    solve.add_argument('--engine', default = 'propagation', choices = sudoku.ENGINE_NAMES)
+    solve.add_argument('--profile', type = int, nargs = '?', const = 20, default = 0, metavar = 'LINES',
+            help = 'profile each solve and print the top functions to stderr')
+    args = parser.parse_args(argv)
+
+    if args.command == 'solve':
+        return solve_command(args)
+    return check_command(args)
+
@@ -0,0 +1,128 @@
+'''
+Exact cover solving engine (Knuth's Algorithm X).
+
+Sudoku is an exact cover problem: each (cell, value) choice is a row that
+covers four constraint columns -- the cell is filled, and the value appears
+in its row, its column and its subgrid. A solution picks rows so that every
+one of the 324 columns is covered exactly once.
+
+The links are kept as a dict of sets (column -> rows still covering it) plus
+the static row -> columns table, which is the usual fast way to run
+Algorithm X in Python: covering and uncovering are set operations instead of
+pointer surgery on node objects.
+'''
+import time
+
+from sudoku import BIT, MASK_VALUES, STANDARD, SearchTimeout, subgrid_index
+
+
+def row_id(index, value):
+    return index * 9 + value - 1
+
+
+def constraint_columns(index, value):
+    row = index // 9
+    col = index % 9
+    return (
+            index,                                          # cell is filled
+            81 + row * 9 + value - 1,                       # value in row
+            162 + col * 9 + value - 1,                      # value in column
+            243 + subgrid_index(index) * 9 + value - 1,     # value in subgrid
+            )
+
+
+# row id -> the four columns it covers, for all 729 (cell, value) choices
+COLUMNS_FOR_ROW = tuple( constraint_columns(i, v) for i in range(81) for v in range(1, 10) )
+
+
+def build_columns(masks):
+    '''
+    Build the column -> rows map for a board, leaving out every (cell, value)
+    choice that is no longer a candidate.
+    '''
+    X = dict( (c, set()) for c in range(324) )
+    for i in range(81):
+        for v in MASK_VALUES[masks[i]]:
+            r = row_id(i, v)
+            for c in COLUMNS_FOR_ROW[r]:
+                X[c].add(r)
+    return X
+
+
+def select(X, r):
+    '''
+    Cover the columns of row r, removing every other row that clashes with
+    it. Returns the removed columns so deselect() can put them back.
+    '''
+    cols = []
+    for j in COLUMNS_FOR_ROW[r]:
+        for i in X[j]:
+            for k in COLUMNS_FOR_ROW[i]:
+                if k != j:
+                    X[k].remove(i)
+        cols.append(X.pop(j))
+    return cols
+
+
+def deselect(X, r, cols):
+    for j in reversed(COLUMNS_FOR_ROW[r]):
+        X[j] = cols.pop()
+        for i in X[j]:
+            for k in COLUMNS_FOR_ROW[i]:
+                if k != j:
+                    X[k].add(i)
+
+
+class Search:
+    '''
+    One run of Algorithm X over a column map. solutions() yields each exact
+    cover as a list of row ids; `nodes` counts the rows tried. Raises
+    SearchTimeout once time.perf_counter() passes `deadline`.
+    '''
+    def __init__(self, X, deadline = None):
+        self.X = X
+        self.nodes = 0
+        self.deadline = deadline
+
+    def solutions(self, partial = None):
+        X = self.X
+        if partial is None:
+            partial = []
+        if not X:
+            yield list(partial)
+            return
+
+        # branch on the column with the fewest rows left
+        c = min(X, key = lambda c: len(X[c]))
+        for r in list(X[c]):
+            self.nodes += 1
+            if self.deadline is not None and time.perf_counter() > self.deadline:
+                raise SearchTimeout()
+            partial.append(r)
+            cols = select(X, r)
+            for solution in self.solutions(partial):
+                yield solution
+            deselect(X, r, cols)
+            partial.pop()
+
+
+class DLXEngine:
+    '''
+    Solve a standard 9x9 Grid as an exact cover problem, starting from the
+    candidates left on its board.
+    '''
+    name = 'dlx'
+
+    def solve(self, grid):
+        if grid.geometry is not STANDARD:
+            raise ValueError("The dlx engine only solves 9x9 boards")
+        search = Search(build_columns(grid.board.masks), grid.deadline)
+        solution = next(search.solutions(), None)
+        grid.stats.branches += search.nodes
+        if solution is None:
+            return False
+
+        masks = grid.board.masks
+        for r in solution:
+            masks[r // 9] = BIT[r % 9 + 1]
+        return True
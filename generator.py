@@ -0,0 +1,220 @@
+#!/usr/local/bin/python
+'''
+Random puzzle generation with difficulty grading.
+
+    python generator.py --count 1000 --seed 42 [--workers N] [--grade hard] [--output puzzles.txt.gz]
+
+Each puzzle starts from a random full grid. Clues are then removed in random
+order, and a removal is kept only if the puzzle still has a unique solution.
+Puzzles are graded by the cheapest set of propagation rules that solves them
+without search, or as 'search' along with the branches the solver needed.
+
+Puzzle n of a run is generated from its own Random seeded with (seed, n), so
+a run is reproducible whatever the number of workers. Puzzles are written
+one per line in the format Grid.parse_grid reads, in order.
+'''
+import argparse
+import collections
+import concurrent.futures
+import os
+import random
+import sys
+import time
+from array import array
+
+import puzzleio
+import sudoku
+from sudoku import ALL_VALUES, BIT, MASK_VALUES, PEERS, POPCOUNT
+
+
+# the rules each grade may use, easiest first
+GRADES = (
+        ('easy', ('hidden_singles',)),
+        ('medium', ('hidden_singles', 'naked_pairs', 'hidden_pairs')),
+        ('hard', ('hidden_singles', 'naked_pairs', 'hidden_pairs', 'pointing', 'claiming')),
+        ('fiendish', sudoku.RULE_ORDER),
+        )
+GRADE_NAMES = tuple( name for name, _ in GRADES ) + ('search',)
+
+DEFAULT_CHUNKSIZE = 16
+
+
+def puzzle_rng(seed, number):
+    return random.Random('%d:%d' % (seed, number))
+
+
+def random_solution(rng):
+    '''
+    A random full grid, found by searching an empty board: branch on the
+    cell with the fewest candidates, trying its values in random order.
+    '''
+    board = sudoku.Board()
+    board.trail = []
+
+    def fill():
+        best = None
+        for i, mask in enumerate(board.masks):
+            if POPCOUNT[mask] > 1 and (best is None or POPCOUNT[mask] < POPCOUNT[board.masks[best]]):
+                best = i
+        if best is None:
+            return True
+
+        values = list(MASK_VALUES[board.masks[best]])
+        rng.shuffle(values)
+        for v in values:
+            mark = board.mark()
+            if board.assign(best, v) and fill():
+                return True
+            board.undo(mark)
+        return False
+
+    fill()
+    return ''.join( str(board.get_value(i)) for i in range(81) )
+
+
+def candidate_masks(values):
+    '''
+    Board masks for a list of 81 values (0 for blank), with the givens
+    eliminated from their peers' candidates but nothing propagated further.
+    Much cheaper than Grid.parse_grid when it is done for every clue removed.
+    '''
+    masks = array('H', [ALL_VALUES,]) * 81
+    for i, v in enumerate(values):
+        if v:
+            masks[i] = BIT[v]
+        else:
+            taken = 0
+            for p in PEERS[i]:
+                taken |= BIT[values[p]]
+            masks[i] = ALL_VALUES & ~taken
+    return masks
+
+
+def has_other_solution(values, index, value, rules = sudoku.DEFAULT_RULES):
+    '''
+    Whether the puzzle has a solution with something other than `value` at
+    `index`. If it has a solution with `value` there, this says whether
+    blanking that cell lost uniqueness.
+    '''
+    masks = candidate_masks(values)
+    if not masks[index] & ~BIT[value]:
+        # nothing else fits there
+        return False
+    g = sudoku.Grid(rules = rules)
+    g.board = sudoku.Board(masks)
+    if not g.board.eliminate(index, value):
+        return False
+    return g.count_solutions(1) > 0
+
+
+def remove_clues(solution, rng, symmetric = True):
+    '''
+    Blank the cells of a full grid in random order, skipping any whose
+    removal would give the puzzle a second solution. With `symmetric`, cells
+    are removed in pairs mirrored through the centre.
+    '''
+    full = [ int(c) for c in solution ]
+    values = list(full)
+    order = list(range(41 if symmetric else 81))
+    rng.shuffle(order)
+    for i in order:
+        cells = (i, 80 - i) if symmetric and i != 40 else (i,)
+        trial = list(values)
+        for c in cells:
+            trial[c] = 0
+        # the puzzle is known to be solvable with `solution`, so it stays
+        # unique as long as the blanked cells can't take other values
+        if not any( has_other_solution(trial, c, full[c]) for c in cells ):
+            values = trial
+    return ''.join( str(v) if v else '.' for v in values )
+
+
+def grade(puzzle):
+    '''
+    Return (grade, branches): the first of GRADES whose rules solve the puzzle
+    without search, with 0 branches, or 'search' and the branches needed
+    with every rule.
+    '''
+    for name, rules in GRADES:
+        g = sudoku.Grid(rules = rules)
+        g.parse_grid(puzzle)
+        if g.reduce() and g.propagate() and g.is_solved():
+            return name, 0
+
+    g = sudoku.Grid(rules = sudoku.RULE_ORDER)
+    g.parse_grid(puzzle)
+    g.solve()
+    return 'search', g.nodes
+
+
+def generate_one(seed, number, symmetric = True):
+    '''
+    Generate and grade puzzle `number` of the run seeded with `seed`.
+    Returns a dict with the puzzle, its solution, clue count, grade and
+    branches.
+    '''
+    rng = puzzle_rng(seed, number)
+    solution = random_solution(rng)
+    puzzle = remove_clues(solution, rng, symmetric)
+    level, branches = grade(puzzle)
+    return {'puzzle': puzzle, 'solution': solution, 'clues': 81 - puzzle.count('.'),
+            'grade': level, 'branches': branches}
+
+
+def generate_chunk(seed, start, count, symmetric):
+    return [ generate_one(seed, n, symmetric) for n in range(start, start + count) ]
+
+
+def generate(count, seed = 0, workers = None, chunksize = DEFAULT_CHUNKSIZE, symmetric = True):
+    '''
+    Yield `count` generated puzzles (see generate_one) in order, spread over
+    `workers` processes (all cores by default; 1 runs in this process).
+    '''
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for n in range(count):
+            yield generate_one(seed, n, symmetric)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as pool:
+        pending = collections.deque()
+        for start in range(0, count, chunksize):
+            pending.append(pool.submit(generate_chunk, seed, start, min(chunksize, count - start), symmetric))
+            # keep a couple of chunks per worker queued, and no more
+            if len(pending) >= workers * 2:
+                for result in pending.popleft().result():
+                    yield result
+        while pending:
+            for result in pending.popleft().result():
+                yield result
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Generate graded puzzles.')
+    parser.add_argument('--count', type = int, default = 100, help = 'puzzles to generate')
+    parser.add_argument('--seed', type = int, default = 0, help = 'seed for the run')
+    parser.add_argument('--workers', type = int, default = None, help = 'worker processes (default: all cores)')
+    parser.add_argument('--chunksize', type = int, default = DEFAULT_CHUNKSIZE, help = 'puzzles per worker task')
+    parser.add_argument('--asymmetric', action = 'store_true', help = 'remove clues one at a time')
+    parser.add_argument('--grade', action = 'append', choices = GRADE_NAMES,
+            help = 'only write puzzles of this grade (repeatable)')
+    parser.add_argument('--output', default = '-', help = 'where to write puzzles (.gz to compress)')
+    args = parser.parse_args(argv)
+
+    t_start = time.perf_counter()
+    grades = collections.Counter()
+    with puzzleio.PuzzleWriter(args.output) as writer:
+        for result in generate(args.count, args.seed, args.workers, args.chunksize, not args.asymmetric):
+            grades[result['grade']] += 1
+            if not args.grade or result['grade'] in args.grade:
+                writer.write(result['puzzle'])
+
+    elapsed = time.perf_counter() - t_start
+    sys.stderr.write("%d puzzles in %.2f s (%.1f/s), %d written: %s\n" % (
+        args.count, elapsed, args.count / elapsed if elapsed else 0.0, writer.count,
+        ', '.join( '%d %s' % (grades[name], name) for name in GRADE_NAMES if grades[name] )))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,204 @@
+'''
+An incremental board for interactive play.
+
+A PlayBoard holds what the player has written, which may be wrong, apart
+from what the solver deduces. Each unit keeps a count of every value
+placed in it, so setting or clearing a cell, undoing a move and asking
+which cells are in conflict only touch the cell's own units rather than
+rescanning the grid:
+
+    board = PlayBoard(puzzle)
+    board.set(10, 4)
+    board.conflicts()       # cells that clash with another in a unit
+    board.undo()
+    board.hint()            # Hint(index, value, reason) or None
+
+Alongside the counts each unit keeps a mask of the values placed in it, so
+an empty cell's candidates are whatever none of its three units holds.
+Nothing else depends on the move history, so clearing a cell or undoing
+any move is as cheap as setting one. hint() reads forced moves off those
+candidates instead of solving the puzzle again.
+'''
+import collections
+
+import sudoku
+from sudoku import STANDARD
+
+
+Hint = collections.namedtuple('Hint', 'index value reason')
+Hint.__doc__ = '''
+A forced move: `value` is the only thing that can go in cell `index`, for
+the `reason` given ('naked single', 'hidden single' or the name of the
+propagation rule that narrowed it down).
+'''
+
+# rules hint() falls back on once there are no singles left, cheapest first
+HINT_RULES = tuple( name for name in sudoku.RULE_ORDER if name != 'hidden_singles' )
+
+
+class PlayBoard:
+    '''
+    The player's view of a puzzle. Cells hold values from 1 to the board
+    size, or 0 when empty; the givens can't be changed.
+    '''
+    def __init__(self, puzzle = None, geometry = STANDARD):
+        self.geometry = geometry
+        n = geometry.size
+        self.values = [0,] * geometry.cell_count
+        self.givens = [False,] * geometry.cell_count
+        # counts[u * (n + 1) + v]: how many cells of unit u hold v
+        self.counts = [0,] * (len(geometry.units) * (n + 1))
+        # used[u]: mask of the values placed in unit u
+        self.used = [0,] * len(geometry.units)
+        # unit index of each cell's row, column and box
+        self.cell_units = tuple( (i // n, n + i % n, 2 * n + geometry.box_for_cell[i])
+                for i in range(geometry.cell_count) )
+        # (unit, value) pairs placed more than once in the unit
+        self.duplicates = set()
+        # (index, previous value) for each move
+        self.history = []
+
+        if puzzle:
+            for i, c in enumerate(puzzle):
+                if c in geometry.symbols:
+                    self.place(i, geometry.symbols.index(c) + 1)
+                    self.givens[i] = True
+
+    def place(self, index, value):
+        '''
+        Write `value` (0 to empty the cell) into the counts, keeping the
+        used masks and the duplicate set up to date.
+        '''
+        stride = self.geometry.size + 1
+        bit = self.geometry.bit
+        old = self.values[index]
+        if old == value:
+            return
+        counts = self.counts
+        used = self.used
+        for u in self.cell_units[index]:
+            if old:
+                k = u * stride + old
+                counts[k] -= 1
+                if counts[k] == 1:
+                    self.duplicates.discard((u, old))
+                elif counts[k] == 0:
+                    used[u] &= ~bit[old]
+            if value:
+                k = u * stride + value
+                counts[k] += 1
+                if counts[k] == 2:
+                    self.duplicates.add((u, value))
+                elif counts[k] == 1:
+                    used[u] |= bit[value]
+        self.values[index] = value
+
+    def set(self, index, value):
+        '''
+        Write `value` into a cell, or empty it with 0. Raises ValueError for
+        a given or a value out of range. A value that clashes with another
+        cell is still written; see conflicts().
+        '''
+        if self.givens[index]:
+            raise ValueError("Cell %d is a given" % index)
+        if not 0 <= value <= self.geometry.size:
+            raise ValueError("Invalid value: %r" % value)
+        old = self.values[index]
+        if old == value:
+            return
+        self.history.append((index, old))
+        self.place(index, value)
+
+    def clear(self, index):
+        self.set(index, 0)
+
+    def undo(self):
+        '''
+        Take back the last move, returning its cell index, or None if there
+        is nothing to undo.
+        '''
+        if not self.history:
+            return None
+        index, old = self.history.pop()
+        self.place(index, old)
+        return index
+
+    def is_conflicting(self, index):
+        value = self.values[index]
+        if not value:
+            return False
+        stride = self.geometry.size + 1
+        return any( self.counts[u * stride + value] > 1 for u in self.cell_units[index] )
+
+    def conflicts(self):
+        '''
+        The set of cells holding a value that appears more than once in one
+        of their units.
+        '''
+        units = self.geometry.units
+        return set( i for u, value in self.duplicates for i in units[u] if self.values[i] == value )
+
+    def candidate_mask(self, index):
+        used = self.used
+        a, b, c = self.cell_units[index]
+        return self.geometry.all_values & ~(used[a] | used[b] | used[c])
+
+    def candidates(self, index):
+        '''
+        The values that wouldn't clash with anything already placed in the
+        cell's units.
+        '''
+        return list(self.geometry.mask_values[self.candidate_mask(index)])
+
+    def is_complete(self):
+        return all(self.values) and not self.duplicates
+
+    def hint(self):
+        '''
+        Return a Hint for an empty cell whose value is forced by what has been
+        placed so far, or None if there is none or the board already has a
+        mistake that makes the candidates contradictory.
+        '''
+        if self.duplicates:
+            return None
+        geometry = self.geometry
+        values = self.values
+        masks = [ geometry.bit[v] if v else self.candidate_mask(i) for i, v in enumerate(values) ]
+
+        for i, mask in enumerate(masks):
+            if not values[i]:
+                if not mask:
+                    return None
+                if geometry.popcount[mask] == 1:
+                    return Hint(i, geometry.lowest_value[mask], 'naked single')
+
+        for unit in geometry.units:
+            once = 0
+            twice = 0
+            for i in unit:
+                twice |= once & masks[i]
+                once |= masks[i]
+            if once != geometry.all_values:
+                # a value with nowhere left to go
+                return None
+            singles = once & ~twice
+            for i in unit:
+                if not values[i] and masks[i] & singles:
+                    return Hint(i, geometry.lowest_value[masks[i] & singles], 'hidden single')
+
+        # work the stronger rules on a board until one of them forces a cell
+        board = sudoku.Board(masks, geometry)
+        for name in HINT_RULES:
+            if not sudoku.RULES[name](board) or not sudoku.hidden_singles(board):
+                return None
+            for i, mask in enumerate(board.masks):
+                if not values[i] and geometry.popcount[mask] == 1:
+                    return Hint(i, geometry.lowest_value[mask], name)
+        return None
+
+    def format(self):
+        '''
+        The values placed, in the format Grid.parse_grid reads.
+        '''
+        symbols = '.' + self.geometry.symbols
+        return ''.join( symbols[v] for v in self.values )
@@ -0,0 +1,285 @@
+#!/usr/local/bin/python
+'''
+Parallel search for single hard puzzles.
+
+    python portfolio.py puzzles.txt [--workers N] [--mode split|race] [--timeout SECONDS]
+
+Grid.search is one recursion in one interpreter, so a pathological puzzle
+takes as long as it takes however many cores there are. A Portfolio keeps
+a set of worker processes and puts all of them on one puzzle at a time:
+
+  split  propagate the puzzle, expand the search tree breadth first until
+         there are a few subtrees per worker, and search the subtrees in
+         parallel
+  race   search the whole puzzle in every worker, each with a different
+         branching strategy, value order or seed (see RACERS)
+
+The first solution found wins and the rest of the job is cancelled. The
+workers share a counter holding the last job cancelled, which searches
+check on every branch, so a worker is free again one branch after its job
+is cancelled. Work still queued for a cancelled job is skipped.
+'''
+import argparse
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import batch
+import puzzleio
+import sudoku
+
+
+MODES = ('split', 'race')
+# subtrees per worker in split mode, so that a worker that finishes an
+# empty subtree early has more to take on
+SPLIT_FACTOR = 4
+# how often to check that the workers are still alive while waiting
+POLL_INTERVAL = 0.1
+
+# (branching, value order, seed) for each worker in race mode, in order;
+# workers beyond these race 'hidden' with randomly ordered values
+RACERS = (
+        (sudoku.DEFAULT_BRANCHING, sudoku.DEFAULT_VALUE_ORDER, None),
+        ('mrv_degree', 'natural', None),
+        ('hidden', 'random', 1),
+        ('mrv', 'random', 2),
+        ('mrv_degree', 'random', 3),
+        ('mrv', 'lcv', None),
+        )
+
+
+class Cancelled(Exception):
+    '''
+    Raised inside a worker's search once its job has been cancelled.
+    '''
+
+
+def racers(count):
+    return [ RACERS[k] if k < len(RACERS) else ('hidden', 'random', k) for k in range(count) ]
+
+
+def split(grid, count):
+    '''
+    Expand the search tree of a propagated grid breadth first until there
+    are at least `count` subtrees, or nothing left to expand, and return
+    their boards. A solved board ends the expansion and comes back alone;
+    an empty list means there is no solution.
+    '''
+    board = grid.board
+    frontier = [board]
+    try:
+        while 0 < len(frontier) < count:
+            level = []
+            for k, node in enumerate(frontier):
+                grid.board = node
+                choices, _ = grid.next_branch()
+                if choices is None:
+                    return [node]
+                for index, value in choices:
+                    child = node.copy()
+                    if child.assign(index, value) and sudoku.propagate(child, grid.rules):
+                        level.append(child)
+                if len(level) + len(frontier) - k - 1 >= count:
+                    # enough already; keep the rest of this level as it is
+                    level.extend(frontier[k + 1:])
+                    break
+            frontier = level
+    finally:
+        grid.board = board
+    return frontier
+
+
+def worker(tasks, results, cancelled, rules):
+    '''
+    Search boards sent on `tasks` until a None arrives, putting (job,
+    number, status, masks, nodes) on `results` for each.
+    '''
+    for job, number, masks, geometry, (branching, value_order, seed) in iter(tasks.get, None):
+        if cancelled.value >= job:
+            results.put((job, number, 'cancelled', None, 0))
+            continue
+
+        def check(grid, index, value, depth):
+            if cancelled.value >= job:
+                raise Cancelled()
+
+        g = sudoku.Grid(rules = rules, geometry = geometry, branching = branching,
+                value_order = value_order, seed = seed)
+        g.board = sudoku.Board(masks, geometry)
+        g.on_branch = check
+        status = 'error'
+        solution = None
+        try:
+            if g.propagate() and g.search():
+                status = 'solved'
+                solution = g.board.masks
+            else:
+                status = 'unsolvable'
+        except Cancelled:
+            status = 'cancelled'
+        except Exception as e:
+            status = 'error: %r' % e
+        results.put((job, number, status, solution, g.nodes))
+
+
+class Portfolio:
+    '''
+    A pool of `workers` processes (all cores by default) that solve one
+    puzzle at a time together. Use it as a context manager, or call close()
+    when done with it.
+    '''
+    def __init__(self, workers = None, rules = sudoku.DEFAULT_RULES, mode = 'split'):
+        if mode not in MODES:
+            raise ValueError("Unknown mode: %s" % mode)
+        self.workers = workers or os.cpu_count() or 1
+        self.rules = tuple(rules)
+        self.mode = mode
+        self.job = 0
+        self.processes = None
+
+    def start(self):
+        context = multiprocessing.get_context(batch.START_METHOD)
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        self.cancelled = context.Value('q', 0, lock = False)
+        self.processes = [ context.Process(target = worker, args = (self.tasks, self.results, self.cancelled, self.rules),
+                daemon = True) for _ in range(self.workers) ]
+        for p in self.processes:
+            p.start()
+
+    def close(self):
+        if self.processes is None:
+            return
+        self.cancelled.value = self.job
+        for _ in self.processes:
+            self.tasks.put(None)
+        for p in self.processes:
+            p.join(1.0)
+            if p.is_alive():
+                p.terminate()
+        self.processes = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def solve(self, puzzle, mode = None, timeout = None, geometry = None):
+        '''
+        Solve a puzzle string, returning the solved Grid, or None if there
+        is no solution. The board size goes by the puzzle's length unless a
+        Geometry is given. The Grid's stats count the branches of every
+        worker on the job. Raises ValueError for a malformed puzzle and SearchTimeout once
+        `timeout` seconds have passed.
+        '''
+        t_start = time.perf_counter()
+        mode = mode or self.mode
+        if mode not in MODES:
+            raise ValueError("Unknown mode: %s" % mode)
+        if self.processes is None:
+            self.start()
+        geometry = geometry or sudoku.geometry_for(puzzle)
+
+        g = sudoku.Grid(rules = self.rules, geometry = geometry)
+        if not g.parse_grid(puzzle):
+            raise ValueError("Invalid puzzle")
+        g.stats = stats = sudoku.SolveStats()
+        if not g.propagate():
+            return None
+        if g.is_solved():
+            stats.time = time.perf_counter() - t_start
+            return g
+
+        if mode == 'split':
+            config = (sudoku.DEFAULT_BRANCHING, sudoku.DEFAULT_VALUE_ORDER, None)
+            tasks = [ (board.masks, config) for board in split(g, self.workers * SPLIT_FACTOR) ]
+        else:
+            tasks = [ (g.board.masks, config) for config in racers(self.workers) ]
+
+        self.job += 1
+        job = self.job
+        for number, (masks, config) in enumerate(tasks):
+            self.tasks.put((job, number, masks, geometry, config))
+
+        deadline = None if timeout is None else t_start + timeout
+        pending = len(tasks)
+        try:
+            while pending:
+                wait = POLL_INTERVAL
+                if deadline is not None:
+                    wait = min(wait, deadline - time.perf_counter())
+                    if wait <= 0:
+                        raise sudoku.SearchTimeout()
+                try:
+                    done, number, status, solution, nodes = self.results.get(timeout = wait)
+                except queue.Empty:
+                    if not all( p.is_alive() for p in self.processes ):
+                        self.close()
+                        raise BrokenProcessPool("A portfolio worker died")
+                    continue
+                if done != job:
+                    # left over from a job cancelled earlier
+                    continue
+                pending -= 1
+                stats.branches += nodes
+                if status == 'solved':
+                    g.board = sudoku.Board(solution, geometry)
+                    return g
+                if status == 'unsolvable' and mode == 'race':
+                    # every racer searches the whole puzzle, so one that
+                    # runs out of choices has proved there is no solution
+                    return None
+                if status.startswith('error'):
+                    raise RuntimeError("Portfolio worker failed: %s" % status)
+            return None
+        finally:
+            # stop every worker still on this job
+            self.cancelled.value = job
+            stats.time = time.perf_counter() - t_start
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Solve hard puzzles one at a time on every core.')
+    parser.add_argument('files', nargs = '*', default = ['-'], help = 'puzzle files (default: stdin)')
+    parser.add_argument('--format', default = 'auto', choices = puzzleio.FORMATS, help = 'input format')
+    parser.add_argument('--output', default = '-', help = 'where to write solutions (.gz to compress)')
+    parser.add_argument('--workers', type = int, default = None, help = 'worker processes (default: all cores)')
+    parser.add_argument('--mode', default = 'split', choices = MODES, help = 'split the tree or race strategies')
+    parser.add_argument('--timeout', type = float, default = None, help = 'seconds allowed per puzzle')
+    args = parser.parse_args(argv)
+
+    count = 0
+    solved = 0
+    worst = 0.0
+    t_start = time.perf_counter()
+    with Portfolio(args.workers, mode = args.mode) as portfolio, puzzleio.PuzzleWriter(args.output) as writer:
+        for puzzle in puzzleio.read_corpora(args.files, args.format):
+            count += 1
+            t_puzzle = time.perf_counter()
+            try:
+                g = portfolio.solve(puzzle, timeout = args.timeout)
+                status = 'unsolvable' if g is None else 'solved'
+            except ValueError:
+                status = 'invalid'
+            except sudoku.SearchTimeout:
+                status = 'timeout'
+            worst = max(worst, time.perf_counter() - t_puzzle)
+            if status == 'solved':
+                solved += 1
+                writer.write(g.format_grid())
+            else:
+                writer.write(status)
+
+    elapsed = time.perf_counter() - t_start
+    sys.stderr.write("%d puzzles in %.2f s on %d workers (%s), %d solved, worst %.1f ms\n" % (
+        count, elapsed, portfolio.workers, args.mode, solved, 1000 * worst))
+    return 0 if solved == count else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,202 @@
+'''
+Streaming puzzle readers and writers.
+
+Two text formats are understood:
+
+  line    one puzzle per line, as Grid.parse_grid accepts
+  blocks  one line per row of the board, puzzles separated by a line of
+          '=' (or '-') characters or a blank line, as in easy50.txt
+
+Puzzles are read and written one at a time, so memory use doesn't depend on
+the size of the corpus. Files ending in .gz (or starting with the gzip magic
+number) are decompressed on the fly, and uncompressed files can be read
+through mmap so that multi-GB corpora are paged in by the OS rather than
+buffered by Python.
+'''
+import gzip
+import io
+import mmap
+import sys
+
+import sudoku
+
+
+GZIP_MAGIC = b'\x1f\x8b'
+FORMATS = ('auto', 'line', 'blocks')
+
+
+def is_separator(line):
+    return line and line.strip('=-') == ''
+
+
+def open_binary(path):
+    '''
+    Open a puzzle file for reading as bytes, decompressing it if it is
+    gzipped. '-' is stdin.
+    '''
+    if path == '-':
+        f = sys.stdin.buffer
+    else:
+        f = open(path, 'rb')
+    if hasattr(f, 'peek') and f.peek(2)[:2] == GZIP_MAGIC:
+        if f is sys.stdin.buffer:
+            return gzip.GzipFile(fileobj = f)
+        # a GzipFile doesn't close a file object it was handed, so let
+        # gzip open the file itself
+        f.close()
+        return gzip.open(path, 'rb')
+    return f
+
+
+def mmap_lines(path):
+    '''
+    Yield the lines of an uncompressed file through a read-only memory map.
+    '''
+    with open(path, 'rb') as f:
+        if f.read(2) == GZIP_MAGIC:
+            raise ValueError("%s is gzipped; mmap reads need an uncompressed file" % path)
+        try:
+            m = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        except ValueError:
+            # empty file
+            return
+        try:
+            line = m.readline()
+            while line:
+                yield line
+                line = m.readline()
+        finally:
+            m.close()
+
+
+def read_lines(source, use_mmap = False):
+    '''
+    Yield decoded lines from a path, '-' for stdin, or an open file.
+    '''
+    if use_mmap and isinstance(source, str) and source != '-':
+        lines = mmap_lines(source)
+    elif isinstance(source, str):
+        lines = open_binary(source)
+    else:
+        lines = source
+
+    try:
+        for line in lines:
+            if isinstance(line, bytes):
+                line = line.decode('ascii')
+            yield line
+    finally:
+        if isinstance(source, str) and source != '-' and hasattr(lines, 'close'):
+            lines.close()
+
+
+def parse_puzzles(lines, format = 'auto'):
+    '''
+    Turn lines of text into puzzle strings. In 'blocks' mode the first row
+    of each block sets the board size, so a block of 16 rows of 16 cells is
+    a 16x16 puzzle. In 'auto' mode only 9x9 blocks are recognised: a line
+    of 9 characters is taken as a row of a block and any other line as a
+    whole puzzle, so both formats can be mixed in one file. Blank lines and
+    lines starting with '#' are skipped.
+    '''
+    if format not in FORMATS:
+        raise ValueError("Unknown puzzle format: %s" % format)
+
+    rows = []
+    width = 9
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#') or is_separator(line):
+            if rows:
+                raise ValueError("Line %d: puzzle block ended after %d rows" % (number, len(rows)))
+            continue
+
+        if format == 'line' or (format == 'auto' and not rows and len(line) != 9):
+            # an odd-sized line still gets yielded so the solver can report
+            # it as invalid without losing its place in the input
+            yield line
+            continue
+
+        if not rows:
+            width = len(line)
+        if len(line) != width:
+            raise ValueError("Line %d: expected a row of %d cells, got %d" % (number, width, len(line)))
+        rows.append(line)
+        if len(rows) == width:
+            yield ''.join(rows)
+            rows = []
+
+    if rows:
+        raise ValueError("Puzzle block truncated after %d rows at end of input" % len(rows))
+
+
+def read_puzzles(source, format = 'auto', use_mmap = False):
+    '''
+    Lazily yield puzzles from a path, '-' for stdin, or an open text or
+    binary file.
+    '''
+    return parse_puzzles(read_lines(source, use_mmap), format)
+
+
+def read_corpora(sources, format = 'auto', use_mmap = False):
+    for source in sources:
+        for puzzle in read_puzzles(source, format, use_mmap):
+            yield puzzle
+
+
+class PuzzleWriter:
+    '''
+    Write puzzles (or solutions) one at a time in either format. Paths ending
+    in .gz are gzipped; '-' is stdout. Blocks are as wide as the board the
+    puzzle's length makes; write() raises ValueError for a length no board
+    has.
+    '''
+    def __init__(self, target, format = 'line'):
+        if format not in ('line', 'blocks'):
+            raise ValueError("Unknown puzzle format: %s" % format)
+        self.format = format
+        self.count = 0
+        self.owned = isinstance(target, str) and target != '-'
+
+        if target == '-':
+            self.f = sys.stdout
+        elif isinstance(target, str) and target.endswith('.gz'):
+            self.f = io.TextIOWrapper(gzip.open(target, 'wb'), encoding = 'ascii')
+        elif isinstance(target, str):
+            self.f = open(target, 'w')
+        else:
+            self.f = target
+
+    def write(self, puzzle):
+        if self.format == 'line':
+            self.f.write(puzzle + '\n')
+        else:
+            n = sudoku.geometry_for(puzzle).size
+            if n * n != len(puzzle):
+                raise ValueError("Can't write a puzzle of %d cells as blocks" % len(puzzle))
+            if self.count:
+                self.f.write('=' * 8 + '\n')
+            self.f.write(''.join( puzzle[i:i + n] + '\n' for i in range(0, n * n, n) ))
+        self.count += 1
+
+    def close(self):
+        if self.owned:
+            self.f.close()
+        else:
+            self.f.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_puzzles(puzzles, target, format = 'line'):
+    '''
+    Stream puzzles to a file, returning how many were written.
+    '''
+    with PuzzleWriter(target, format) as writer:
+        for puzzle in puzzles:
+            writer.write(puzzle)
+    return writer.count
@@ -0,0 +1,189 @@
+'''
+Compact binary encodings of boards and puzzles.
+
+Every encoding starts with a 5 byte header: the magic b'SK', a flags byte,
+and the geometry's box rows and box columns. What follows is every cell
+bit-packed into a little-endian integer, cell 0 in the lowest bits, and
+optionally zlib-compressed:
+
+  board   a Board's candidate masks, `size` bits per cell (92 bytes for 9x9)
+  puzzle  the values of a puzzle, 0 for blank, just enough bits for the
+          largest value (41 bytes for 9x9)
+  many    a 4 byte count after the header, then that many board records
+          back to back, for shipping whole batches at once
+
+Decoding takes bytes, bytearray or memoryview and reads straight out of the
+buffer, so records can be decoded from a larger buffer (an mmap'd cache file
+say) without copying them out first. encode_many and decode_many use numpy
+when it is installed, importing it only when they are called.
+'''
+import zlib
+from array import array
+
+import sudoku
+from sudoku import STANDARD
+
+
+MAGIC = b'SK'
+HEADER_SIZE = 5
+
+# flags
+COMPRESSED = 0x01
+PUZZLE = 0x02
+MANY = 0x04
+
+
+def get_numpy():
+    '''
+    numpy, or None if it isn't installed. It is imported on first use, since
+    unpickling a Board in a fresh worker process imports this module and
+    shouldn't have to pay for numpy too.
+    '''
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def value_bits(geometry):
+    return geometry.size.bit_length()
+
+
+def record_size(geometry, bits):
+    return (geometry.cell_count * bits + 7) // 8
+
+
+def pack(cells, bits):
+    '''
+    Bit-pack a sequence of small ints, `bits` each, into bytes.
+    '''
+    packed = 0
+    for v in reversed(cells):
+        packed = packed << bits | v
+    return packed.to_bytes((len(cells) * bits + 7) // 8, 'little')
+
+
+def unpack(data, count, bits):
+    '''
+    The `count` ints of `bits` each packed into `data` by pack().
+    '''
+    packed = int.from_bytes(data, 'little')
+    mask = (1 << bits) - 1
+    cells = []
+    for _ in range(count):
+        cells.append(packed & mask)
+        packed >>= bits
+    return cells
+
+
+def header(flags, geometry):
+    return MAGIC + bytes((flags, geometry.box_rows, geometry.box_cols))
+
+
+def read_header(data):
+    '''
+    Return (flags, geometry, payload) for an encoding, where payload is a
+    memoryview of everything after the header, decompressed if need be.
+    '''
+    view = memoryview(data)
+    if len(view) < HEADER_SIZE or view[:2] != MAGIC:
+        raise ValueError("Not a serialized board")
+    flags, box_rows, box_cols = view[2], view[3], view[4]
+    payload = view[HEADER_SIZE:]
+    if flags & COMPRESSED:
+        payload = memoryview(zlib.decompress(payload))
+    return flags, sudoku.get_geometry(box_rows, box_cols), payload
+
+
+def finish(flags, geometry, payload, compress):
+    if compress:
+        return header(flags | COMPRESSED, geometry) + zlib.compress(payload)
+    return header(flags, geometry) + payload
+
+
+def encode_board(board, compress = False):
+    '''
+    A Board's candidate masks as bytes.
+    '''
+    geometry = board.geometry
+    return finish(0, geometry, pack(board.masks, geometry.size), compress)
+
+
+def decode_board(data):
+    flags, geometry, payload = read_header(data)
+    if flags & (PUZZLE | MANY):
+        raise ValueError("Not a single board")
+    masks = unpack(payload[:record_size(geometry, geometry.size)], geometry.cell_count, geometry.size)
+    return sudoku.Board(masks, geometry)
+
+
+def encode_puzzle(puzzle, geometry = STANDARD, compress = False):
+    '''
+    A puzzle string, as Grid.parse_grid reads, as bytes. Only its values
+    are kept, so anything that isn't a value decodes as '.'.
+    '''
+    if len(puzzle) != geometry.cell_count:
+        raise ValueError("Invalid grid (length %d)" % len(puzzle))
+    symbols = geometry.symbols
+    values = [ symbols.index(c) + 1 if c in symbols else 0 for c in puzzle ]
+    return finish(PUZZLE, geometry, pack(values, value_bits(geometry)), compress)
+
+
+def decode_puzzle(data):
+    flags, geometry, payload = read_header(data)
+    if not flags & PUZZLE:
+        raise ValueError("Not a serialized puzzle")
+    bits = value_bits(geometry)
+    values = unpack(payload[:record_size(geometry, bits)], geometry.cell_count, bits)
+    symbols = '.' + geometry.symbols
+    return ''.join( symbols[v] for v in values )
+
+
+def encode_many(boards, geometry = STANDARD, compress = False):
+    '''
+    Encode a batch of boards, given as Boards, mask sequences or an (N,
+    cells) numpy array of masks such as vectorized.propagate returns.
+    '''
+    size = record_size(geometry, geometry.size)
+    np = get_numpy()
+    if np is not None:
+        masks = np.array([ getattr(b, 'masks', b) for b in boards ] if not isinstance(boards, np.ndarray) else boards,
+                dtype = np.uint32).reshape(-1, geometry.cell_count)
+        count = len(masks)
+        bits = (masks[:, :, None] >> np.arange(geometry.size, dtype = np.uint32)) & 1
+        payload = np.packbits(bits.reshape(count, -1).astype(np.uint8), axis = 1, bitorder = 'little')
+        payload = payload[:, :size].tobytes()
+    else:
+        records = [ pack(getattr(b, 'masks', b), geometry.size) for b in boards ]
+        count = len(records)
+        payload = b''.join(records)
+    return finish(MANY, geometry, count.to_bytes(4, 'little') + payload, compress)
+
+
+def decode_many(data, as_array = False):
+    '''
+    Decode a batch from encode_many into a list of mask arrays, or into one
+    (N, cells) numpy array with `as_array`.
+    '''
+    flags, geometry, payload = read_header(data)
+    if not flags & MANY:
+        raise ValueError("Not a serialized batch")
+    count = int.from_bytes(payload[:4], 'little')
+    size = record_size(geometry, geometry.size)
+    records = payload[4:4 + count * size]
+
+    np = get_numpy()
+    if np is not None:
+        raw = np.frombuffer(records, dtype = np.uint8).reshape(count, size)
+        bits = np.unpackbits(raw, axis = 1, bitorder = 'little')[:, :geometry.cell_count * geometry.size]
+        weights = (1 << np.arange(geometry.size, dtype = np.uint32))
+        masks = (bits.reshape(count, geometry.cell_count, geometry.size) * weights).sum(axis = 2, dtype = np.uint32)
+        if as_array:
+            return masks.astype(np.uint16 if geometry.typecode == 'H' else np.uint32)
+        return [ array(geometry.typecode, row.tolist()) for row in masks ]
+
+    if as_array:
+        raise ValueError("as_array needs numpy")
+    return [ array(geometry.typecode, unpack(records[k * size:(k + 1) * size], geometry.cell_count, geometry.size))
+            for k in range(count) ]
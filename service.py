@@ -0,0 +1,468 @@
+#!/usr/local/bin/python
+'''
+An asyncio solving service for puzzles sent over HTTP/JSON or stdin.
+
+    python service.py [--port 8080] [--workers N]    # HTTP on localhost
+    python service.py --stdin < puzzles.txt          # one puzzle per line
+
+Endpoints:
+
+    POST /solve   {"puzzle": "...", "timeout": 2.0}  -> a result, as batch.solve_one
+                  {"puzzles": ["...", ...]}          -> {"results": [...]}
+    GET  /stats   counters and latency histograms
+    GET  /health
+
+Requests are queued and coalesced into micro-batches: a batch is sent to
+the worker pool once `batch_size` puzzles are waiting or `batch_delay`
+seconds after its first one arrived, with at most one batch per worker in
+flight. The queue holds at most `max_queue` puzzles; past that, HTTP
+requests are turned away with 429 while stdin input simply waits. Every
+puzzle has a deadline (--timeout by default, or the request's "timeout"),
+and one that expires, whether queued or being solved, is answered with the
+status 'timeout' (HTTP 504 for a single puzzle).
+'''
+import argparse
+import asyncio
+import bisect
+import concurrent.futures
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import batch
+import sudoku
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_BATCH_DELAY = 0.002
+DEFAULT_MAX_QUEUE = 1024
+DEFAULT_TIMEOUT = 5.0
+# time allowed on top of a deadline for a worker's answer to come back
+DEADLINE_GRACE = 0.05
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+        413: 'Payload Too Large', 429: 'Too Many Requests', 504: 'Gateway Timeout'}
+MAX_BODY = 1 << 20
+
+
+class QueueFull(Exception):
+    '''
+    Raised when a request would take the queue past its limit.
+    '''
+
+
+class LatencyHistogram:
+    '''
+    Counts of latencies in roughly logarithmic buckets, from half a
+    millisecond up to ten seconds. Percentiles are read off as the upper
+    bound of the bucket they fall in.
+    '''
+    BOUNDS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0)
+
+    def __init__(self):
+        self.counts = [0,] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p):
+        if not self.count:
+            return 0.0
+        rank = self.count * p / 100.0
+        seen = 0
+        for bound, count in zip(self.BOUNDS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def as_dict(self):
+        buckets = dict( ('le_%g' % bound, count) for bound, count in zip(self.BOUNDS, self.counts) )
+        buckets['inf'] = self.counts[-1]
+        return {
+                'count': self.count,
+                'mean': self.total / self.count if self.count else 0.0,
+                'p50': self.percentile(50),
+                'p90': self.percentile(90),
+                'p99': self.percentile(99),
+                'max': self.max,
+                'buckets': buckets,
+                }
+
+
+def solve_requests(requests, engine, rules):
+    '''
+    Solve a batch of (puzzle, seconds left) pairs in a worker process.
+    '''
+    return [ batch.solve_one(puzzle, engine, rules, timeout) for puzzle, timeout in requests ]
+
+
+class Service:
+    '''
+    Queues puzzles and solves them in micro-batches on a process pool. Use
+    it from a running event loop:
+
+        service = Service(workers = 4)
+        await service.start()
+        result = await service.solve(puzzle)
+        await service.close()
+    '''
+    def __init__(self, workers = None, batch_size = DEFAULT_BATCH_SIZE, batch_delay = DEFAULT_BATCH_DELAY,
+            max_queue = DEFAULT_MAX_QUEUE, timeout = DEFAULT_TIMEOUT, engine = 'propagation',
+            rules = sudoku.DEFAULT_RULES):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.engine = engine
+        self.rules = rules
+
+        self.pool = None
+        self.queue = None
+        self.slots = None
+        self.dispatcher = None
+        self.running = set()
+        self.counts = dict( (name, 0) for name in ('accepted', 'rejected', 'batches', 'expired') + batch.STATUSES )
+        self.latency = dict( (name, LatencyHistogram()) for name in ('queue', 'solve', 'total') )
+        self.batch_sizes = LatencyHistogram()
+
+    def new_pool(self):
+        return concurrent.futures.ProcessPoolExecutor(max_workers = self.workers,
+                mp_context = multiprocessing.get_context(batch.START_METHOD))
+
+    async def start(self):
+        self.pool = self.new_pool()
+        # start the workers now rather than on the first requests
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[ loop.run_in_executor(self.pool, solve_requests, [], self.engine, self.rules)
+            for _ in range(self.workers) ])
+        self.queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(self.workers)
+        self.dispatcher = asyncio.ensure_future(self.dispatch())
+
+    async def close(self):
+        self.dispatcher.cancel()
+        if self.running:
+            await asyncio.gather(*self.running, return_exceptions = True)
+        self.pool.shutdown(wait = False, cancel_futures = True)
+
+    def submit(self, puzzle, timeout = None):
+        '''
+        Queue a puzzle, returning a future for its result. Raises QueueFull
+        if the queue is at its limit.
+        '''
+        if self.queue.qsize() >= self.max_queue:
+            self.counts['rejected'] += 1
+            raise QueueFull()
+        now = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((puzzle, now + (timeout or self.timeout), now, future))
+        self.counts['accepted'] += 1
+        return future
+
+    async def solve(self, puzzle, timeout = None):
+        '''
+        Solve one puzzle, returning a result dict (see batch.solve_one) once
+        it is solved or its deadline has passed.
+        '''
+        return (await self.solve_many([puzzle], timeout))[0]
+
+    async def solve_many(self, puzzles, timeout = None):
+        '''
+        Solve several puzzles, all or nothing: raises QueueFull without
+        queueing any of them if they don't all fit.
+        '''
+        if self.queue.qsize() + len(puzzles) > self.max_queue:
+            self.counts['rejected'] += len(puzzles)
+            raise QueueFull()
+        t_start = time.perf_counter()
+        futures = [ self.submit(p, timeout) for p in puzzles ]
+        results = []
+        for puzzle, future in zip(puzzles, futures):
+            try:
+                remaining = t_start + (timeout or self.timeout) - time.perf_counter()
+                result = await asyncio.wait_for(future, max(remaining, 0) + DEADLINE_GRACE)
+            except asyncio.TimeoutError:
+                result = self.expired(puzzle)
+            self.latency['total'].add(time.perf_counter() - t_start)
+            results.append(result)
+        return results
+
+    async def wait_for_room(self):
+        '''
+        Wait until the queue is below its limit, for callers that would
+        rather slow down than be turned away.
+        '''
+        while self.queue.qsize() >= self.max_queue:
+            await asyncio.sleep(self.batch_delay or 0.001)
+
+    def expired(self, puzzle):
+        self.counts['expired'] += 1
+        return {'puzzle': puzzle, 'solution': None, 'status': 'timeout', 'nodes': 0, 'time': 0.0}
+
+    async def dispatch(self):
+        queue = self.queue
+        while True:
+            # waiting for a free worker first lets the batch fill up meanwhile
+            await self.slots.acquire()
+            items = [await queue.get()]
+            if self.batch_delay and queue.qsize() < self.batch_size - 1:
+                await asyncio.sleep(self.batch_delay)
+            while len(items) < self.batch_size and not queue.empty():
+                items.append(queue.get_nowait())
+
+            task = asyncio.ensure_future(self.run_batch(items))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def run_batch(self, items):
+        try:
+            now = time.perf_counter()
+            live = []
+            for puzzle, deadline, queued, future in items:
+                if future.done():
+                    # the caller already gave up on it
+                    continue
+                self.latency['queue'].add(now - queued)
+                if deadline <= now:
+                    future.set_result(self.expired(puzzle))
+                else:
+                    live.append((puzzle, deadline, future))
+            if not live:
+                return
+
+            requests = [ (puzzle, deadline - now) for puzzle, deadline, _ in live ]
+            self.counts['batches'] += 1
+            self.batch_sizes.add(len(live))
+            pool = self.pool
+            try:
+                results = await asyncio.get_running_loop().run_in_executor(
+                        pool, solve_requests, requests, self.engine, self.rules)
+            except BrokenProcessPool:
+                # every batch in flight on the dead pool ends up here; only
+                # the first replaces it, or the others would shut down the
+                # new pool under batches already sent to it
+                if self.pool is pool:
+                    logger.error("worker pool died; restarting it")
+                    pool.shutdown(wait = False, cancel_futures = True)
+                    self.pool = self.new_pool()
+                results = [ batch.error_result(puzzle, 'worker process died') for puzzle, _, _ in live ]
+            except asyncio.CancelledError:
+                # the service is closing; answer the callers rather than
+                # leave them waiting for their deadlines
+                for puzzle, _, future in live:
+                    if not future.done():
+                        future.set_result(batch.error_result(puzzle, 'service closed'))
+                raise
+            except Exception as e:
+                logger.exception("batch failed")
+                results = [ batch.error_result(puzzle, repr(e)) for puzzle, _, _ in live ]
+
+            for (_, _, future), result in zip(live, results):
+                self.counts[result['status']] += 1
+                self.latency['solve'].add(result['time'])
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self.slots.release()
+
+    def stats(self):
+        stats = dict(self.counts)
+        stats['queued'] = self.queue.qsize()
+        stats['workers'] = self.workers
+        stats['latency'] = dict( (name, h.as_dict()) for name, h in self.latency.items() )
+        stats['batch_size'] = {'mean': self.batch_sizes.total / self.batch_sizes.count if self.batch_sizes.count else 0.0,
+                'max': self.batch_sizes.max}
+        return stats
+
+
+async def read_request(reader):
+    '''
+    Read one HTTP request. Returns (method, path, headers, body), or None at
+    the end of the connection.
+    '''
+    line = await reader.readline()
+    if not line:
+        return None
+    parts = line.decode('latin-1').split()
+    if len(parts) != 3:
+        raise ValueError("Malformed request line")
+    method, path, _ = parts
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get('content-length', 0))
+    if length > MAX_BODY:
+        raise ValueError("Request body too large")
+    body = await reader.readexactly(length) if length else b''
+    return method, path, headers, body
+
+
+def write_response(writer, status, body, keep_alive = True):
+    data = json.dumps(body).encode('utf-8')
+    head = ["HTTP/1.1 %d %s" % (status, REASONS[status]),
+            "Content-Type: application/json",
+            "Content-Length: %d" % len(data),
+            "Connection: %s" % ('keep-alive' if keep_alive else 'close')]
+    if status == 429:
+        head.append("Retry-After: 1")
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + data)
+
+
+async def route(service, method, path, body):
+    '''
+    Handle one request, returning (status, JSON body).
+    '''
+    if path == '/health':
+        return 200, {'status': 'ok'}
+    if path == '/stats':
+        return 200, service.stats()
+    if path != '/solve':
+        return 404, {'error': 'not found'}
+    if method != 'POST':
+        return 405, {'error': 'use POST'}
+
+    try:
+        request = json.loads(body or b'{}')
+        timeout = request.get('timeout')
+        if timeout is not None:
+            timeout = float(timeout)
+        if 'puzzles' in request:
+            puzzles = [ str(p) for p in request['puzzles'] ]
+        else:
+            puzzles = [str(request['puzzle'])]
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return 400, {'error': 'expected {"puzzle": "..."} or {"puzzles": [...]}'}
+
+    try:
+        results = await service.solve_many(puzzles, timeout)
+    except QueueFull:
+        return 429, {'error': 'queue full'}
+    if 'puzzles' in request:
+        return 200, {'results': results}
+    return 504 if results[0]['status'] == 'timeout' else 200, results[0]
+
+
+async def handle_connection(service, reader, writer):
+    try:
+        while True:
+            try:
+                request = await read_request(reader)
+            except (ValueError, asyncio.IncompleteReadError) as e:
+                write_response(writer, 400, {'error': str(e)}, keep_alive = False)
+                break
+            if request is None:
+                break
+            method, path, headers, body = request
+            status, response = await route(service, method, path.split('?')[0], body)
+            keep_alive = headers.get('connection', '').lower() != 'close'
+            write_response(writer, status, response, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_http(service, host, port):
+    server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), host, port)
+    logger.info("listening on %s", ', '.join( '%s:%d' % s.getsockname()[:2] for s in server.sockets ))
+    async with server:
+        await server.serve_forever()
+
+
+async def serve_stdin(service, output = None):
+    '''
+    Solve puzzles read one per line from stdin, writing each solution (or
+    the puzzle's status) on its own line in input order. Reading pauses
+    while the queue is full.
+    '''
+    output = output or sys.stdout
+    loop = asyncio.get_running_loop()
+    pending = asyncio.Queue(maxsize = service.max_queue)
+
+    async def write_results():
+        while True:
+            future = await pending.get()
+            if future is None:
+                break
+            result = await future
+            output.write((result['solution'] or result['status']) + '\n')
+        output.flush()
+
+    writer = asyncio.ensure_future(write_results())
+    # stdin may be a regular file, which the event loop can't watch, so the
+    # blocking reads go to a thread
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.readline)
+        if not line:
+            break
+        puzzle = line.strip()
+        if not puzzle or puzzle.startswith('#'):
+            continue
+        await service.wait_for_room()
+        await pending.put(asyncio.ensure_future(service.solve(puzzle)))
+    await pending.put(None)
+    await writer
+
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description = 'Serve puzzle solving over HTTP/JSON or stdin.')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 8080)
+    parser.add_argument('--stdin', action = 'store_true', help = 'solve puzzles from stdin instead of serving HTTP')
+    parser.add_argument('--workers', type = int, default = None, help = 'worker processes (default: all cores)')
+    parser.add_argument('--batch-size', type = int, default = DEFAULT_BATCH_SIZE, help = 'most puzzles per batch')
+    parser.add_argument('--batch-delay', type = float, default = DEFAULT_BATCH_DELAY,
+            help = 'seconds to wait for a batch to fill')
+    parser.add_argument('--max-queue', type = int, default = DEFAULT_MAX_QUEUE, help = 'puzzles queued before 429s')
+    parser.add_argument('--timeout', type = float, default = DEFAULT_TIMEOUT, help = 'default seconds per puzzle')
+    parser.add_argument('--engine', default = 'propagation', choices = sudoku.ENGINE_NAMES)
+    return parser.parse_args(argv)
+
+
+async def run(args):
+    service = Service(args.workers, args.batch_size, args.batch_delay, args.max_queue, args.timeout, args.engine)
+    await service.start()
+    try:
+        if args.stdin:
+            await serve_stdin(service)
+        else:
+            await serve_http(service, args.host, args.port)
+    finally:
+        await service.close()
+
+
+def main(argv = None):
+    args = parse_args(argv)
+    logging.basicConfig(level = logging.INFO, format = '%(asctime)s %(name)s %(message)s')
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
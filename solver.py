@@ -0,0 +1,1313 @@
+'''
+The solver: board geometry, candidate Boards, propagation rules, branching
+strategies and Grid, the puzzle and its search.
+
+Everything here is re-exported by the sudoku module, which is what the rest
+of the code imports; the command line lives in cli.py. It imports only what
+solving needs: profiling, the other engines, the built-in corpora and
+random numbers are all loaded when first used.
+'''
+import itertools
+import sys
+import time
+from array import array
+
+
+def debug(message, *args):
+    '''
+    Log a debug message. No handler can have been set up unless the
+    application has imported logging, so it isn't imported here just to
+    drop the message.
+    '''
+    logging = sys.modules.get('logging')
+    if logging is not None:
+        logging.getLogger('sudoku').debug(message, *args)
+
+
+def __getattr__(name):
+    if name == 'grids':
+        import corpora
+        return corpora.grids
+    raise AttributeError("module 'sudoku' has no attribute %r" % name)
+
+
+class MaskTable(dict):
+    '''
+    A lookup table indexed by candidate mask that fills itself in on first
+    use, for boards with too many values to tabulate every mask up front.
+    It starts over once it holds `maxsize` masks, so a long-running process
+    doesn't keep every mask it has ever met.
+    '''
+    def __init__(self, function, maxsize = 1 << 14):
+        self.function = function
+        self.maxsize = maxsize
+
+    def __missing__(self, mask):
+        if len(self) >= self.maxsize:
+            self.clear()
+        value = self[mask] = self.function(mask)
+        return value
+
+
+class BitCount:
+    '''
+    Number of candidates in a mask, looked up like the 9x9 table but worked
+    out on each lookup.
+    '''
+    __getitem__ = staticmethod(int.bit_count)
+
+
+class LowestValue:
+    '''
+    The lowest candidate in a mask, looked up like the 9x9 table but worked
+    out on each lookup.
+    '''
+    __getitem__ = staticmethod(lambda mask: (mask & -mask).bit_length())
+
+
+class Geometry:
+    '''
+    The shape of a board: `size` x `size` cells split into boxes of
+    `box_rows` x `box_cols`, holding the values 1 to `size`. The standard
+    9x9 board is Geometry(3, 3); 6x6 with 2x3 boxes is Geometry(2, 3).
+
+    Cells are indexed in row-major order, and every unit and peer lookup
+    goes through tables built here once, so propagation never has to build
+    lists to find its neighbours. Candidate sets are `size`-bit masks: bit
+    v-1 is set while v is still possible.
+    '''
+    def __init__(self, box_rows = 3, box_cols = 3):
+        n = box_rows * box_cols
+        if n > 35:
+            raise ValueError("Boards larger than 35x35 are not supported")
+        self.box_rows = box_rows
+        self.box_cols = box_cols
+        self.size = n
+        self.cell_count = n * n
+
+        self.rows = tuple( tuple( row * n + col for col in range(n) ) for row in range(n) )
+        self.cols = tuple( tuple( row * n + col for row in range(n) ) for col in range(n) )
+        self.boxes = tuple(
+                tuple( (start_row + i) * n + start_col + j for i in range(box_rows) for j in range(box_cols) )
+                for start_row in range(0, n, box_rows) for start_col in range(0, n, box_cols) )
+        self.units = self.rows + self.cols + self.boxes
+        self.box_for_cell = tuple( (i // n) // box_rows * box_rows + (i % n) // box_cols
+                for i in range(self.cell_count) )
+        self.units_for_cell = tuple( (self.rows[i // n], self.cols[i % n], self.boxes[self.box_for_cell[i]])
+                for i in range(self.cell_count) )
+        self.peers = tuple( tuple( sorted( set(sum(units, ())) - set([i,]) ) ) for i, units in enumerate(self.units_for_cell) )
+
+        self.all_values = (1 << n) - 1
+        self.bit = (0,) + tuple( 1 << (v - 1) for v in range(1, n + 1) )
+        # the characters values are written with: digits, then letters
+        self.symbols = ('123456789' + 'ABCDEFGHIJKLMNOPQRSTUVWXYZ')[:n]
+
+        # lookup tables indexed by mask: number of candidates, the lowest
+        # candidate (the cell's value when there is only one), and the
+        # candidates themselves. Up to 9 values they are built in full;
+        # beyond that the counts are worked out on each lookup and only the
+        # most recent candidate tuples are kept.
+        def mask_values(mask):
+            return tuple( v for v in range(1, n + 1) if mask & self.bit[v] )
+        if n <= 9:
+            masks = range(self.all_values + 1)
+            self.popcount = bytes( bin(mask).count('1') for mask in masks )
+            self.lowest_value = bytes( (mask & -mask).bit_length() for mask in masks )
+            self.mask_values = tuple( mask_values(mask) for mask in masks )
+        else:
+            self.popcount = BitCount()
+            self.lowest_value = LowestValue()
+            self.mask_values = MaskTable(mask_values)
+        self.typecode = 'H' if n <= 16 else 'L'
+
+    def __repr__(self):
+        return 'Geometry(%d, %d)' % (self.box_rows, self.box_cols)
+
+    def __reduce__(self):
+        return get_geometry, (self.box_rows, self.box_cols)
+
+
+_geometries = {}
+
+def get_geometry(box_rows = 3, box_cols = 3):
+    '''
+    The Geometry for boxes of `box_rows` x `box_cols`, built once and shared.
+    '''
+    key = (box_rows, box_cols)
+    if key not in _geometries:
+        _geometries[key] = Geometry(box_rows, box_cols)
+    return _geometries[key]
+
+
+STANDARD = get_geometry(3, 3)
+
+
+def geometry_for(puzzle):
+    '''
+    The Geometry a puzzle string is written for, going by its length: a
+    board of n x n cells split into the squarest boxes that fit, with no
+    more rows than columns (2x3 for 6x6, 3x4 for 12x12, 4x4 for 16x16).
+    Lengths no supported board has fall back on STANDARD, so that
+    Grid.parse_grid rejects them.
+    '''
+    n = int(len(puzzle) ** 0.5 + 0.5)
+    if n * n != len(puzzle) or not 4 <= n <= 35:
+        return STANDARD
+    box_rows = max( r for r in range(1, n + 1) if n % r == 0 and r * r <= n )
+    if box_rows == 1:
+        # a prime size has no boxes
+        return STANDARD
+    return get_geometry(box_rows, n // box_rows)
+
+# the standard board's tables, for code that only deals with 9x9
+ROWS = STANDARD.rows
+COLS = STANDARD.cols
+SUBGRIDS = STANDARD.boxes
+UNITS = STANDARD.units
+UNITS_FOR_CELL = STANDARD.units_for_cell
+PEERS = STANDARD.peers
+SUBGRID_FOR_CELL = STANDARD.box_for_cell
+ALL_VALUES = STANDARD.all_values
+BIT = STANDARD.bit
+POPCOUNT = STANDARD.popcount
+LOWEST_VALUE = STANDARD.lowest_value
+MASK_VALUES = STANDARD.mask_values
+
+
+def subgrid_index(index):
+    return SUBGRID_FOR_CELL[index]
+
+
+def values_to_mask(values, geometry = STANDARD):
+    mask = 0
+    for v in values:
+        mask |= geometry.bit[v]
+    return mask
+
+
+class Board:
+    '''
+    Candidate state for every cell of a board of the given Geometry, stored
+    as masks in a single flat array. A cell is solved once its mask has
+    exactly one bit left. Copying a board is one buffer copy.
+
+    While `trail` is a list, every mask change is recorded on it so that
+    undo() can roll the board back to an earlier mark() without copying.
+    `eliminations` counts the candidates removed over the board's lifetime,
+    and `on_assign`, if set, is called with (index, value) whenever a cell
+    is narrowed down to a single value.
+    '''
+    __slots__ = ('geometry', 'masks', 'trail', 'eliminations', 'on_assign')
+
+    def __init__(self, masks = None, geometry = STANDARD):
+        self.geometry = geometry
+        if masks is None:
+            self.masks = array(geometry.typecode, [geometry.all_values,]) * geometry.cell_count
+        else:
+            self.masks = array(geometry.typecode, masks)
+        self.trail = None
+        self.eliminations = 0
+        self.on_assign = None
+
+    def copy(self):
+        board = Board.__new__(Board)
+        board.geometry = self.geometry
+        board.masks = self.masks[:]
+        board.trail = None
+        board.eliminations = self.eliminations
+        board.on_assign = self.on_assign
+        return board
+
+    def __reduce__(self):
+        # pickled as the packed masks; the trail and hook are left behind
+        import serialize
+        return serialize.decode_board, (serialize.encode_board(self),)
+
+    def mark(self):
+        return len(self.trail)
+
+    def undo(self, mark):
+        '''
+        Restore every mask changed since `mark`, most recent first.
+        '''
+        masks = self.masks
+        trail = self.trail
+        shift = self.geometry.size
+        all_values = self.geometry.all_values
+        while len(trail) > mark:
+            entry = trail.pop()
+            masks[entry >> shift] = entry & all_values
+
+    def get_value(self, index):
+        mask = self.masks[index]
+        if self.geometry.popcount[mask] == 1:
+            return self.geometry.lowest_value[mask]
+        return None
+
+    def get_candidates(self, index):
+        return self.geometry.mask_values[self.masks[index]]
+
+    def assign(self, index, value):
+        '''
+        Eliminate every candidate except `value` from a cell, propagating to
+        its peers. Return False if that leads to a contradiction.
+        '''
+        geometry = self.geometry
+        mask = self.masks[index]
+        if not mask & geometry.bit[value]:
+            return False
+        for other in geometry.mask_values[mask & ~geometry.bit[value]]:
+            if not self.eliminate(index, other):
+                return False
+        return True
+
+    def eliminate(self, index, value):
+        '''
+        Remove a candidate from a cell. If the cell is left with a single
+        candidate, eliminate that from all of its peers. Return False if a
+        cell runs out of candidates.
+        '''
+        masks = self.masks
+        mask = masks[index]
+        geometry = self.geometry
+        bit = geometry.bit[value]
+        if not mask & bit:
+            return True
+
+        if self.trail is not None:
+            # index and previous mask packed into one int
+            self.trail.append(index << geometry.size | mask)
+
+        mask &= ~bit
+        if not mask:
+            return False
+        masks[index] = mask
+        self.eliminations += 1
+
+        if geometry.popcount[mask] == 1:
+            value = geometry.lowest_value[mask]
+            if self.on_assign is not None:
+                self.on_assign(index, value)
+            return self.eliminate_from_peers(index, value)
+        return True
+
+    def eliminate_from_peers(self, index, value):
+        masks = self.masks
+        bit = self.geometry.bit[value]
+        for peer in self.geometry.peers[index]:
+            if masks[peer] & bit and not self.eliminate(peer, value):
+                return False
+        return True
+
+
+class Cell:
+    '''
+    A view of one cell of a Grid. All state lives in the grid's Board; the
+    view only knows where to look.
+    '''
+    __slots__ = ('parent', 'index')
+
+    def __init__(self, row, col, parent, value = None):
+        self.parent = parent
+        self.index = row * parent.geometry.size + col
+        if value:
+            self.set_value(value)
+
+    @property
+    def row(self):
+        return self.index // self.parent.geometry.size
+
+    @property
+    def col(self):
+        return self.index % self.parent.geometry.size
+
+    @property
+    def value(self):
+        return self.parent.board.get_value(self.index)
+
+    @property
+    def possible_values(self):
+        return list(self.parent.board.get_candidates(self.index))
+
+    @possible_values.setter
+    def possible_values(self, values):
+        self.parent.board.masks[self.index] = values_to_mask(values, self.parent.geometry)
+
+    def __unicode__(self):
+        if not self.get_value():
+            return ' '
+        symbols = self.parent.geometry.symbols
+        return "".join( symbols[v - 1] for v in self.possible_values )
+
+    def __str__(self):
+        return self.__unicode__()
+
+    def get_value(self):
+        return self.value
+    
+    def set_value(self, value):
+        if not value:
+            return False
+
+        return self.parent.board.assign(self.index, value)
+
+    def get_peers(self):
+        return self.parent.get_peers(self)
+
+
+    def eliminate_value(self, value):
+        '''
+        Remove a value from the list of possible values.
+        If this cell is set to this value or this value is not in the list of possible values, return False.
+        Otherwise return True
+        '''
+        if not value:
+            return True
+
+        return self.parent.board.eliminate(self.index, value)
+
+
+# Propagation rules. Each takes a Board, makes whatever eliminations it can
+# justify and returns False if it finds a contradiction. They are run in
+# order to a fixpoint by propagate(), which goes back to the first (cheapest)
+# rule whenever a later one changes something.
+
+
+
+def eliminate_mask(board, index, mask):
+    for v in board.geometry.mask_values[mask]:
+        if not board.eliminate(index, v):
+            return False
+    return True
+
+
+def hidden_singles(board):
+    '''
+    A value that fits in only one cell of a unit goes there.
+    '''
+    masks = board.masks
+    geometry = board.geometry
+    popcount = geometry.popcount
+    for unit in geometry.units:
+        once = 0
+        twice = 0
+        for i in unit:
+            mask = masks[i]
+            twice |= once & mask
+            once |= mask
+        if once != geometry.all_values:
+            # some value has nowhere left to go
+            return False
+
+        singles = once & ~twice
+        if not singles:
+            continue
+        for i in unit:
+            mask = masks[i]
+            if popcount[mask] > 1 and mask & singles:
+                if popcount[mask & singles] > 1:
+                    # two values that can only go in the same cell
+                    return False
+                if not board.assign(i, geometry.lowest_value[mask & singles]):
+                    return False
+    return True
+
+
+def naked_subsets(board, size):
+    '''
+    If `size` cells of a unit have only `size` candidates between them, those
+    values can be eliminated from the rest of the unit.
+    '''
+    masks = board.masks
+    popcount = board.geometry.popcount
+    for unit in board.geometry.units:
+        cells = [ i for i in unit if 1 < popcount[masks[i]] <= size ]
+        for subset in itertools.combinations(cells, size):
+            union = 0
+            for i in subset:
+                union |= masks[i]
+            if popcount[union] < size:
+                return False
+            if popcount[union] > size:
+                continue
+            for i in unit:
+                if i not in subset and masks[i] & union:
+                    if not eliminate_mask(board, i, masks[i] & union):
+                        return False
+    return True
+
+
+def hidden_subsets(board, size):
+    '''
+    If `size` values of a unit can only go in the same `size` cells, every
+    other candidate can be eliminated from those cells.
+    '''
+    masks = board.masks
+    geometry = board.geometry
+    popcount = geometry.popcount
+    mask_values = geometry.mask_values
+    for unit in geometry.units:
+        solved = 0
+        # where[v] has bit p set if value v can go in unit[p]
+        where = [0,] * (geometry.size + 1)
+        for p, i in enumerate(unit):
+            mask = masks[i]
+            if popcount[mask] == 1:
+                solved |= mask
+                continue
+            for v in mask_values[mask]:
+                where[v] |= 1 << p
+
+        values = [ v for v in range(1, geometry.size + 1)
+                if not solved & geometry.bit[v] and 1 < popcount[where[v]] <= size ]
+        for subset in itertools.combinations(values, size):
+            places = 0
+            for v in subset:
+                places |= where[v]
+            if popcount[places] < size:
+                return False
+            if popcount[places] > size:
+                continue
+            keep = values_to_mask(subset, geometry)
+            # positions are stored as bits, so mask_values gives p + 1
+            for p in mask_values[places]:
+                i = unit[p - 1]
+                if masks[i] & ~keep:
+                    if not eliminate_mask(board, i, masks[i] & ~keep):
+                        return False
+    return True
+
+
+def naked_pairs(board):
+    return naked_subsets(board, 2)
+
+
+def naked_triples(board):
+    return naked_subsets(board, 3)
+
+
+def hidden_pairs(board):
+    return hidden_subsets(board, 2)
+
+
+def hidden_triples(board):
+    return hidden_subsets(board, 3)
+
+
+def pointing(board):
+    '''
+    If a value's places in a subgrid all lie in one row (or column), it can't
+    go anywhere else in that row (or column).
+    '''
+    masks = board.masks
+    geometry = board.geometry
+    for s, subgrid in enumerate(geometry.boxes):
+        for v in range(1, geometry.size + 1):
+            bit = geometry.bit[v]
+            cells = [ i for i in subgrid if masks[i] & bit ]
+            if len(cells) < 2:
+                continue
+            for line in geometry.units_for_cell[cells[0]][:2]:
+                if all( i in line for i in cells ):
+                    for i in line:
+                        if geometry.box_for_cell[i] != s and masks[i] & bit:
+                            if not board.eliminate(i, v):
+                                return False
+    return True
+
+
+def claiming(board):
+    '''
+    If a value's places in a row (or column) all lie in one subgrid, it can't
+    go anywhere else in that subgrid. Also known as box/line reduction.
+    '''
+    masks = board.masks
+    geometry = board.geometry
+    box_for_cell = geometry.box_for_cell
+    for line in geometry.rows + geometry.cols:
+        for v in range(1, geometry.size + 1):
+            bit = geometry.bit[v]
+            cells = [ i for i in line if masks[i] & bit ]
+            if len(cells) < 2:
+                continue
+            s = box_for_cell[cells[0]]
+            if all( box_for_cell[i] == s for i in cells ):
+                for i in geometry.boxes[s]:
+                    if i not in line and masks[i] & bit:
+                        if not board.eliminate(i, v):
+                            return False
+    return True
+
+
+RULES = {
+        'hidden_singles': hidden_singles,
+        'naked_pairs': naked_pairs,
+        'hidden_pairs': hidden_pairs,
+        'pointing': pointing,
+        'claiming': claiming,
+        'naked_triples': naked_triples,
+        'hidden_triples': hidden_triples,
+        }
+# cheapest first; propagate() goes back to the start after every change
+RULE_ORDER = ('hidden_singles', 'naked_pairs', 'hidden_pairs', 'pointing', 'claiming',
+        'naked_triples', 'hidden_triples')
+DEFAULT_RULES = ('hidden_singles',)
+
+
+def get_rules(names):
+    return tuple( RULES[name] for name in names )
+
+
+def propagate(board, rules):
+    '''
+    Run the rules to a fixpoint. Return False on a contradiction.
+    '''
+    masks = board.masks
+    n = 0
+    while n < len(rules):
+        before = masks.tobytes()
+        if not rules[n](board):
+            return False
+        if masks.tobytes() != before:
+            n = 0
+        else:
+            n += 1
+    return True
+
+
+# Branching strategies decide where Grid.search branches next. Each takes the
+# grid and the `unsolved_cells` passed down from the node above, and returns
+# (choices, unsolved_cells) where choices is a list of (index, value)
+# assignments exactly one of which holds in any solution, or None when every
+# cell is solved. Only 'static' uses the unsolved_cells list.
+
+def cell_choices(board, index):
+    return [ (index, v) for v in board.geometry.mask_values[board.masks[index]] ]
+
+
+def fewest_candidates(board):
+    '''
+    The unsolved cell with the fewest candidates, or None if there is none.
+    '''
+    masks = board.masks
+    popcount = board.geometry.popcount
+    best = None
+    fewest = board.geometry.size + 1
+    for i, mask in enumerate(masks):
+        count = popcount[mask]
+        if 1 < count < fewest:
+            best = i
+            fewest = count
+            if count == 2:
+                break
+    return best
+
+
+def select_static(grid, unsolved_cells):
+    '''
+    Cells in the order get_unsolved_cells sorted them before the search
+    started, skipping any solved since.
+    '''
+    cell, remaining_cells = grid.next_unsolved_cell(unsolved_cells)
+    if cell is None:
+        return None, None
+    return cell_choices(grid.board, cell.index), remaining_cells
+
+
+def select_mrv(grid, unsolved_cells):
+    '''
+    The cell with the fewest candidates after propagation at this node.
+    '''
+    index = fewest_candidates(grid.board)
+    if index is None:
+        return None, None
+    return cell_choices(grid.board, index), None
+
+
+def select_mrv_degree(grid, unsolved_cells):
+    '''
+    The cell with the fewest candidates, breaking ties by the most unsolved
+    peers.
+    '''
+    board = grid.board
+    masks = board.masks
+    popcount = board.geometry.popcount
+    peers = board.geometry.peers
+    best = None
+    best_key = None
+    for i, mask in enumerate(masks):
+        count = popcount[mask]
+        if count < 2 or (best_key is not None and count > best_key[0]):
+            continue
+        key = (count, -sum( 1 for p in peers[i] if popcount[masks[p]] > 1 ))
+        if best_key is None or key < best_key:
+            best = i
+            best_key = key
+    if best is None:
+        return None, None
+    return cell_choices(board, best), None
+
+
+def select_hidden(grid, unsolved_cells):
+    '''
+    Whichever is fewer: the candidates of the cell with fewest candidates,
+    or the places left for a value in one unit. Branching on a unit tries
+    each cell the value could still go in.
+    '''
+    board = grid.board
+    geometry = board.geometry
+    masks = board.masks
+    popcount = geometry.popcount
+    mask_values = geometry.mask_values
+    index = fewest_candidates(board)
+    if index is None:
+        return None, None
+    best = cell_choices(board, index)
+
+    for unit in geometry.units:
+        if len(best) <= 2:
+            break
+        places = {}
+        for i in unit:
+            if popcount[masks[i]] > 1:
+                for v in mask_values[masks[i]]:
+                    places.setdefault(v, []).append(i)
+        for v, cells in places.items():
+            if len(cells) < len(best):
+                best = [ (i, v) for i in cells ]
+    return best, None
+
+
+BRANCHING = {
+        'static': select_static,
+        'mrv': select_mrv,
+        'mrv_degree': select_mrv_degree,
+        'hidden': select_hidden,
+        }
+DEFAULT_BRANCHING = 'hidden'
+
+
+# Value orderings put a strategy's choices in the order search tries them.
+# Each takes the grid and the choices.
+
+def natural_order(grid, choices):
+    return choices
+
+
+def least_constraining(grid, choices):
+    '''
+    The assignments that take a candidate away from the fewest peers first.
+    '''
+    masks = grid.board.masks
+    peers = grid.geometry.peers
+    bit = grid.geometry.bit
+    return sorted(choices, key = lambda choice: sum( 1 for p in peers[choice[0]] if masks[p] & bit[choice[1]] ))
+
+
+def random_order(grid, choices):
+    grid.rng.shuffle(choices)
+    return choices
+
+
+VALUE_ORDERS = {
+        'natural': natural_order,
+        'lcv': least_constraining,
+        'random': random_order,
+        }
+DEFAULT_VALUE_ORDER = 'lcv'
+
+
+def get_strategy(table, name):
+    '''
+    Look up a branching strategy or value ordering by name; a function
+    passed in is returned as is.
+    '''
+    if not isinstance(name, str):
+        return name
+    if name not in table:
+        raise ValueError("Unknown strategy: %s" % name)
+    return table[name]
+
+
+class SearchTimeout(Exception):
+    '''
+    Raised by a search that runs past its grid's deadline.
+    '''
+
+
+class PropagationEngine:
+    '''
+    Propagate the givens, then branch with Grid.search.
+    '''
+    name = 'propagation'
+
+    def solve(self, grid):
+        return grid.reduce() and grid.propagate() and grid.search()
+
+
+def get_engine(name):
+    '''
+    Look up a solving engine by name. Every engine has a solve(grid) method
+    that fills in the grid's board and returns True, or returns False if
+    there is no solution. An engine object passed in is returned as is.
+    '''
+    if not isinstance(name, str):
+        return name
+    if name == 'propagation':
+        return PropagationEngine()
+    if name == 'dlx':
+        import dlx
+        return dlx.DLXEngine()
+    raise ValueError("Unknown engine: %s" % name)
+
+ENGINE_NAMES = ('propagation', 'dlx')
+
+
+class SolveStats:
+    '''
+    What one solve did. `branches` counts the candidate assignments tried by
+    search, `backtracks` the ones that failed, `max_depth` the deepest level
+    of search reached, `eliminations` the candidates removed, and `copies`
+    and `undos` the grid copies (copy mode) or trail rollbacks (trail mode)
+    made. `time` is the wall time of Grid.solve in seconds, and `profile`
+    the cProfile.Profile of it if profiling was asked for.
+    '''
+    def __init__(self):
+        self.branches = 0
+        self.backtracks = 0
+        self.max_depth = 0
+        self.eliminations = 0
+        self.copies = 0
+        self.undos = 0
+        self.time = 0.0
+        self.profile = None
+
+    def as_dict(self):
+        return {
+                'branches': self.branches,
+                'backtracks': self.backtracks,
+                'max_depth': self.max_depth,
+                'eliminations': self.eliminations,
+                'copies': self.copies,
+                'undos': self.undos,
+                'time': self.time,
+                }
+
+    def __getstate__(self):
+        # a cProfile.Profile can't be pickled
+        state = dict(self.__dict__)
+        state['profile'] = None
+        return state
+
+    def __repr__(self):
+        return 'SolveStats(%s)' % ', '.join( '%s=%r' % item for item in sorted(self.as_dict().items()) )
+
+
+class Grid:
+    '''
+    A puzzle and its solver, on a standard 9x9 board unless another
+    Geometry is given. Optional hooks, called during search if set:
+
+        on_branch(grid, index, value, depth)     a candidate is being tried
+        on_backtrack(grid, index, value, depth)  that candidate failed
+        on_assign(index, value)                  a cell is down to one value
+
+    `branching` and `value_order` name the strategies search uses (see
+    BRANCHING and VALUE_ORDERS) or are functions of the same form; `seed`
+    seeds the Random that 'random' ordering draws from.
+    '''
+    def __init__(self, grid = None, rules = DEFAULT_RULES, geometry = STANDARD,
+            branching = DEFAULT_BRANCHING, value_order = DEFAULT_VALUE_ORDER, seed = None):
+        self.geometry = geometry
+        self.board = Board(geometry = geometry)
+        # propagation rules run to a fixpoint after every assignment in search
+        self.rules = get_rules(rules)
+        self.branching = get_strategy(BRANCHING, branching)
+        self.value_order = get_strategy(VALUE_ORDERS, value_order)
+        self.seed = seed
+        self.random = None
+        n = geometry.size
+        self.cells=[ Cell(row, col, self) for row in range(n) for col in range(n) ]
+        self.stats = SolveStats()
+        self.on_branch = None
+        self.on_backtrack = None
+        self.on_assign = None
+        # time.perf_counter() value after which search gives up with SearchTimeout
+        self.deadline = None
+        self.puzzle = None
+
+        if grid:
+            self.parse_grid(grid)
+
+    def __deepcopy__(self, memo):
+        # the board holds all of the state; the cells are just views onto it
+        g = Grid.__new__(Grid)
+        g.geometry = self.geometry
+        g.board = self.board.copy()
+        g.rules = self.rules
+        g.branching = self.branching
+        g.value_order = self.value_order
+        g.seed = self.seed
+        g.random = self.random
+        # copies made during search all count towards the same solve
+        g.stats = self.stats
+        g.on_branch = self.on_branch
+        g.on_backtrack = self.on_backtrack
+        g.on_assign = self.on_assign
+        g.deadline = self.deadline
+        g.puzzle = self.puzzle
+        n = self.geometry.size
+        g.cells = [ Cell(row, col, g) for row in range(n) for col in range(n) ]
+        return g
+
+    def __getstate__(self):
+        # the cells are views that are rebuilt on unpickling, and the hooks
+        # are often lambdas that wouldn't pickle. The Random's state is a few
+        # KB, so it starts again from the seed.
+        return {'board': self.board, 'rules': self.rules, 'stats': self.stats,
+                'branching': self.branching, 'value_order': self.value_order, 'seed': self.seed,
+                'deadline': self.deadline, 'puzzle': self.puzzle}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.geometry = self.board.geometry
+        self.random = None
+        self.on_branch = None
+        self.on_backtrack = None
+        self.on_assign = None
+        n = self.geometry.size
+        self.cells = [ Cell(row, col, self) for row in range(n) for col in range(n) ]
+
+    @property
+    def rng(self):
+        # only 'random' value ordering needs one
+        if self.random is None:
+            import random
+            self.random = random.Random(self.seed)
+        return self.random
+
+    @property
+    def nodes(self):
+        return self.stats.branches
+
+    def __str__(self):
+        return self.__unicode__()
+
+    def __unicode__(self):
+        cells_in_conflict = self.find_conflicts()
+        n = self.geometry.size
+        box_rows = self.geometry.box_rows
+        box_cols = self.geometry.box_cols
+        width = 0
+        for i in range(n):
+            for j in range(n):
+                w = len(str(self.cells[i * n + j])) + 1
+                if self.cells[i * n + j] in cells_in_conflict:
+                    w += 2
+                width = max(width, w)
+
+        out=''
+        for i in range(n):
+            row = ''
+            for j in range(n):
+                cell = str(self.cells[i*n + j])
+                if self.cells[i * n + j] in cells_in_conflict:
+                    cell = '-' + cell + '-'
+                out += cell.center(width)
+                if j % box_cols == box_cols - 1 and j < n - 1: out += "| "
+            out += '\r\n'
+            if i % box_rows == box_rows - 1 and i < n - 1:
+                out += ''.join(['-' * (width * box_cols + 1)] * (n // box_cols)) + "\n"
+    
+        return out
+
+    def get_row(self, row):
+        return [ self.cells[i] for i in self.geometry.rows[row] ]
+
+    def get_col(self, col):
+        return [ self.cells[i] for i in self.geometry.cols[col] ]
+
+    def get_subgrid(self, subgrid):
+        # subgrid = 0 is [0-2][0-2], subgrid = 1 is [0-2][3-5], ...
+        return [ self.cells[i] for i in self.geometry.boxes[subgrid] ]
+
+    def get_subgrid_for_cell(self, cell):
+        return self.get_subgrid( self.geometry.box_for_cell[cell.index] )
+
+    def get_all_cells(self):
+        #all_cells = []
+        #for row in range(9):
+        #    all_cells += self.cells[row] 
+        return self.cells
+
+    def get_all_units(self):
+        return [ [ self.cells[i] for i in unit ] for unit in self.geometry.units ]
+
+    def set_cell(self, cell, value):
+        '''
+        Set the value for a cell. If it can't be done because it conflicts with
+        other cells in the row/col/subgrid of this cell or the value is not in 
+        the possible values for the cell, return False. Otherwise, return True
+        '''
+        board = self.board
+        if board.get_value(cell.index) == value:
+            return False
+        for i in self.geometry.peers[cell.index]:
+            if board.get_value(i) == value:
+                return False
+        
+        if not board.masks[cell.index] & self.geometry.bit[value]:
+            return False
+        
+        return cell.set_value(value)
+
+    def get_units_for_cell(self, cell):
+        return [ [ self.cells[i] for i in unit ] for unit in self.geometry.units_for_cell[cell.index] ]
+
+    def get_peers(self, cell):
+        return [ self.cells[i] for i in self.geometry.peers[cell.index] ]
+
+    def reduce_unit(self, unit):
+        for cell in unit:
+            val = cell.get_value()
+            if not val:
+                continue
+
+            for peer in unit:
+                if cell == peer:
+                    continue
+                if val in peer.possible_values:
+                    if not peer.eliminate_value(val):
+                        return False
+
+        return True
+
+
+    def solve(self, engine = 'propagation', profile = False):
+        '''
+        Solve the grid in place with the named engine, returning True if a
+        solution was found. Fresh SolveStats for the run are left in
+        self.stats; with `profile`, they include a cProfile of the run.
+        '''
+        self.stats = stats = SolveStats()
+        board = self.board
+        board.on_assign = self.on_assign
+        eliminations = board.eliminations
+        engine = get_engine(engine)
+
+        t_start = time.perf_counter()
+        try:
+            if profile:
+                import cProfile
+                stats.profile = cProfile.Profile()
+                solved = stats.profile.runcall(engine.solve, self)
+            else:
+                solved = engine.solve(self)
+        finally:
+            stats.time = time.perf_counter() - t_start
+            # copy mode search may have replaced the board
+            stats.eliminations = self.board.eliminations - eliminations
+            self.board.on_assign = None
+
+        debug("%s solve %s: %r", engine.name, 'succeeded' if solved else 'failed', stats)
+        return solved
+
+    def reduce_from_cell(self, cell):
+        val = cell.get_value()
+        if not val:
+            return True
+
+        #print "Reducing from cell %d,%d (%s)" % (cell.row, cell.col, cell)
+
+        return self.board.eliminate_from_peers(cell.index, val)
+
+    def reduce(self):
+        return all (self.reduce_from_cell(cell) for cell in self.get_all_cells())
+
+    def propagate(self):
+        return propagate(self.board, self.rules)
+
+
+    def get_unsolved_cells(self):
+        masks = self.board.masks
+        popcount = self.geometry.popcount
+        unsolved_cells = [ cell for cell in self.cells if popcount[masks[cell.index]] > 1 ]
+        # sort by increasing number of options
+        unsolved_cells.sort(key=lambda x: popcount[masks[x.index]])
+
+        return unsolved_cells
+
+    def next_unsolved_cell(self, unsolved_cells = None):
+        '''
+        Return the first cell of `unsolved_cells` that still has more than one
+        candidate, and the cells after it, or (None, None) if there is none.
+        '''
+        # if no list of unsolved cells was provided, create one
+        if not unsolved_cells:
+            unsolved_cells = self.get_unsolved_cells()
+
+        # propagation from earlier choices may have solved cells further down
+        # the list; skip past them
+        masks = self.board.masks
+        popcount = self.geometry.popcount
+        for start, cell in enumerate(unsolved_cells):
+            if popcount[masks[cell.index]] > 1:
+                return cell, unsolved_cells[start + 1:]
+        return None, None
+
+    def next_branch(self, unsolved_cells = None):
+        '''
+        Return the assignments to try at the next search node, in the order
+        to try them, and the unsolved cells to pass down; (None, None) once
+        every cell is solved.
+        '''
+        choices, remaining_cells = self.branching(self, unsolved_cells)
+        if choices:
+            choices = self.value_order(self, choices)
+        return choices, remaining_cells
+
+    def search(self, unsolved_cells = None, mode = 'trail'):
+        '''
+        Depth first search, branching where the grid's branching strategy
+        says and trying the choices in its value order. In 'trail' mode the
+        board is changed in place and a failed branch is rolled back from the
+        board's trail; 'copy' mode tries every choice on a deepcopy of the
+        grid. Both find the same solution.
+        '''
+        if mode == 'copy':
+            return self.search_copy(unsolved_cells)
+        if mode != 'trail':
+            raise ValueError("Unknown search mode: %s" % mode)
+
+        board = self.board
+        board.trail = []
+        try:
+            return self.search_trail(unsolved_cells)
+        finally:
+            board.trail = None
+
+    def search_trail(self, unsolved_cells = None, depth = 1):
+        choices, remaining_cells = self.next_branch(unsolved_cells)
+        if choices is None:
+            return self.is_solved()
+
+        board = self.board
+        stats = self.stats
+        if depth > stats.max_depth:
+            stats.max_depth = depth
+
+        for index, val in choices:
+            stats.branches += 1
+            if self.deadline is not None and time.perf_counter() > self.deadline:
+                raise SearchTimeout()
+            if self.on_branch is not None:
+                self.on_branch(self, index, val, depth)
+            mark = board.mark()
+
+            if board.assign(index, val) and propagate(board, self.rules) \
+                    and self.search_trail(remaining_cells, depth + 1):
+                return True
+
+            # conflict somewhere below; undo everything this choice eliminated
+            stats.backtracks += 1
+            stats.undos += 1
+            if self.on_backtrack is not None:
+                self.on_backtrack(self, index, val, depth)
+            board.undo(mark)
+
+        return False
+
+    def search_copy(self, unsolved_cells = None, depth = 1):
+        import copy
+
+        choices, remaining_cells = self.next_branch(unsolved_cells)
+        if choices is None:
+            return self.is_solved()
+
+        stats = self.stats
+        if depth > stats.max_depth:
+            stats.max_depth = depth
+
+        # try each choice in turn and continue to recurse
+        for index, val in choices:
+            stats.branches += 1
+            if self.deadline is not None and time.perf_counter() > self.deadline:
+                raise SearchTimeout()
+            if self.on_branch is not None:
+                self.on_branch(self, index, val, depth)
+
+            # make a copy to work on
+            g = copy.deepcopy(self)
+            stats.copies += 1
+
+            # set the cell value and recurse; if we run into a conflict, try another value
+            solved = g.board.assign(index, val) and g.propagate() \
+                    and g.search_copy(remaining_cells, depth + 1)
+            # the copy started with our count; keep what it added
+            self.board.eliminations = g.board.eliminations
+
+            # if we're solved, return True
+            if solved:
+                self.board = g.board
+                return True
+
+            stats.backtracks += 1
+            if self.on_backtrack is not None:
+                self.on_backtrack(self, index, val, depth)
+
+        # we're out of things to try and no solution
+        #print "Out of options and no solution! Returning False"
+        return False
+
+    def count_solutions(self, limit = 2):
+        '''
+        Count the grid's solutions, stopping as soon as `limit` of them have
+        been found (all of them if `limit` is None). The search runs on the
+        board's trail, so nothing is copied and the board is left as it was.
+        Fresh SolveStats for the run are left in self.stats.
+        '''
+        self.stats = stats = SolveStats()
+        board = self.board
+        board.trail = []
+        eliminations = board.eliminations
+        t_start = time.perf_counter()
+        try:
+            if not (self.reduce() and self.propagate()):
+                return 0
+            return self.count_trail(limit)
+        finally:
+            board.undo(0)
+            board.trail = None
+            stats.time = time.perf_counter() - t_start
+            stats.eliminations = board.eliminations - eliminations
+
+    def has_unique_solution(self):
+        return self.count_solutions(2) == 1
+
+    def count_trail(self, limit, unsolved_cells = None, depth = 1):
+        choices, remaining_cells = self.next_branch(unsolved_cells)
+        if choices is None:
+            return 1 if self.is_solved() else 0
+
+        board = self.board
+        stats = self.stats
+        if depth > stats.max_depth:
+            stats.max_depth = depth
+
+        count = 0
+        for index, val in choices:
+            stats.branches += 1
+            if self.deadline is not None and time.perf_counter() > self.deadline:
+                raise SearchTimeout()
+            if self.on_branch is not None:
+                self.on_branch(self, index, val, depth)
+            mark = board.mark()
+
+            found = 0
+            if board.assign(index, val) and propagate(board, self.rules):
+                found = self.count_trail(None if limit is None else limit - count, remaining_cells, depth + 1)
+            if not found:
+                stats.backtracks += 1
+                if self.on_backtrack is not None:
+                    self.on_backtrack(self, index, val, depth)
+
+            # solution or not, roll back to try the next candidate
+            stats.undos += 1
+            board.undo(mark)
+            count += found
+            if limit is not None and count >= limit:
+                break
+
+        return count
+
+    def is_unit_solved(self, unit):
+        values = set( cell.get_value() for cell in unit )
+        # every cell has a final value and none of them repeat
+        return None not in values and len(values) == len(unit)
+
+
+    def is_solved(self):
+        masks = self.board.masks
+        popcount = self.geometry.popcount
+        for unit in self.geometry.units:
+            # every cell has a single value and together they cover them all
+            seen = 0
+            for i in unit:
+                mask = masks[i]
+                if popcount[mask] != 1:
+                    return False
+                seen |= mask
+            if seen != self.geometry.all_values:
+                return False
+        return True
+
+
+    def find_conflicts(self):
+        '''
+        Return the set of solved cells that share their value with another
+        cell of one of their units.
+        '''
+        board = self.board
+        cells_in_conflict = set()
+        for unit in self.geometry.units:
+            # value -> first cell of the unit seen with it
+            seen = {}
+            for i in unit:
+                value = board.get_value(i)
+                if value is None:
+                    continue
+                if value in seen:
+                    cells_in_conflict.add(self.cells[seen[value]])
+                    cells_in_conflict.add(self.cells[i])
+                else:
+                    seen[value] = i
+        return cells_in_conflict
+
+    def format_grid(self):
+        '''
+        The grid as a string of one character per cell (81 for a standard
+        board) in the format parse_grid reads, with '.' for unsolved cells.
+        '''
+        board = self.board
+        symbols = '.' + self.geometry.symbols
+        return ''.join( symbols[board.get_value(i) or 0] for i in range(self.geometry.cell_count) )
+
+    def parse_grid(self, grid):
+        '''
+        Load a puzzle written one character per cell in row-major order: the
+        values as 1-9 and then A-Z on boards larger than 9x9, and '.' or '0'
+        for blanks. Returns False if the puzzle is malformed or its givens
+        conflict.
+        '''
+        geometry = self.geometry
+        if len(grid) != geometry.cell_count:
+            debug("Invalid grid (length %d)", len(grid))
+            return False
+        
+        self.board = Board(geometry = geometry)
+        # the givens, as parsed
+        self.puzzle = grid
+        
+        for i in range(len(grid)):
+            c = grid[i];
+            
+            if c in geometry.symbols:
+                if not self.board.assign(i, geometry.symbols.index(c) + 1):
+                    debug("Conflicting value %c at cell %d,%d", c, i // geometry.size, i % geometry.size)
+                    return False
+            elif c in '.0':
+                pass
+            else:
+                debug("Invalid grid character: %c", c)
+                return False
+
+        return True
+
+
+
+def solve_all():
+    '''
+    Benchmark the solver on the built-in grids; see bench.py for the options.
+    '''
+    import bench
+    return bench.main(['suite', '--corpus', 'grids'])
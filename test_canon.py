@@ -0,0 +1,42 @@
+'''
+Canonical forms and the solution cache built on them.
+'''
+import random
+import time
+
+import canon
+import sudoku
+
+
+FULL_ROW = '123456789' + '.' * 72
+
+
+def test_equivalent_puzzles_share_a_form():
+    rng = random.Random(0)
+    for puzzle in sudoku.grids[:20]:
+        canonical, transform = canon.canonicalize(puzzle)
+        assert canon.apply_transform(puzzle, transform) == canonical
+        other = canon.apply_transform(puzzle, canon.random_transform(rng))
+        assert canon.canonicalize(other)[0] == canonical
+
+
+def test_cache_hits_an_equivalent_puzzle():
+    cache = canon.SolutionCache()
+    puzzle = sudoku.grids[0]
+    other = canon.apply_transform(puzzle, canon.random_transform(random.Random(1)))
+    for p in (puzzle, other):
+        g = sudoku.Grid()
+        g.parse_grid(p)
+        assert g.solve(cache) and g.is_solved()
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_full_row_is_solved_uncached():
+    # a full row ties in every order of its columns
+    t_start = time.perf_counter()
+    cache = canon.SolutionCache()
+    g = sudoku.Grid()
+    g.parse_grid(FULL_ROW)
+    assert g.solve(cache) and g.is_solved()
+    assert time.perf_counter() - t_start < 1.0
+    assert (cache.hits, cache.misses, len(cache.entries)) == (0, 1, 0)
@@ -0,0 +1,53 @@
+'''
+The propagation and dlx engines check each other: they share nothing past
+the parsed board, so agreeing on every solution and solution count is good
+evidence both are right.
+'''
+import itertools
+import random
+
+import dlx
+import sudoku
+
+
+def parsed(puzzle):
+    g = sudoku.Grid()
+    assert g.parse_grid(puzzle)
+    return g
+
+
+def dlx_count(puzzle, limit):
+    search = dlx.Search(dlx.build_columns(parsed(puzzle).board.masks))
+    return len(list(itertools.islice(search.solutions(), limit)))
+
+
+def sparse_puzzles(count, blanks, seed = 0):
+    '''
+    Solutions to sudoku.grids with most of their cells emptied, so that
+    many have more than one solution (between 1 and 50 at 45 to 50 blanks).
+    '''
+    rng = random.Random(seed)
+    puzzles = []
+    for puzzle in sudoku.grids[:count]:
+        g = parsed(puzzle)
+        assert g.solve()
+        cells = list(g.format_grid())
+        for i in rng.sample(range(81), blanks):
+            cells[i] = '.'
+        puzzles.append(''.join(cells))
+    return puzzles
+
+
+def test_engines_agree_on_grids():
+    for puzzle in sudoku.grids:
+        solutions = []
+        for engine in ('propagation', 'dlx'):
+            g = parsed(puzzle)
+            assert g.solve(engine) and g.is_solved(), (engine, puzzle)
+            solutions.append(g.format_grid())
+        assert solutions[0] == solutions[1], puzzle
+
+
+def test_count_solutions_matches_dlx():
+    for puzzle in sudoku.grids[:10] + sparse_puzzles(20, 45) + sparse_puzzles(20, 50, seed = 1):
+        assert parsed(puzzle).count_solutions(50) == dlx_count(puzzle, 50), puzzle
@@ -0,0 +1,29 @@
+'''
+Startup budgets for the command line, which pipelines run once per puzzle.
+The budgets themselves live in bench.py, where `bench.py imports` reports
+the same timings.
+'''
+import bench
+
+
+def setup_module(module):
+    bench.compile_tree()
+
+
+def test_import_sudoku():
+    for module, budget in bench.IMPORT_BUDGETS.items():
+        assert bench.import_time(module) <= budget, module
+
+
+def test_cli_imports():
+    assert bench.cli_import_time() <= bench.CLI_IMPORT_BUDGET
+
+
+def test_cli_runs_within_budget():
+    assert bench.cli_time() <= bench.CLI_BUDGET
+
+
+def test_cli_imports_no_extras():
+    # what the solve command should not pull in for an easy puzzle
+    imported = set( name for name, _, _ in bench.import_times(['sudoku.py', 'solve', bench.CLI_PUZZLE]) )
+    assert not imported & set(['logging', 'random', 'copy', 'cProfile', 'corpora', 'numpy', 'bench'])
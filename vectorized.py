@@ -0,0 +1,267 @@
+#!/usr/local/bin/python
+'''
+Batch solving with NumPy: propagate thousands of boards at once.
+
+    python vectorized.py puzzles.txt [more.txt ...]
+
+N boards are held as an (N, 81) uint16 array of candidate masks, the same
+9-bit masks Board uses. Each round of the fixpoint loop eliminates solved
+values from their peers and fills in hidden singles for every board in the
+batch with a handful of array operations, so the interpreter overhead is
+paid per round rather than per cell. Most easy puzzles are solved by
+propagation alone. Boards that stall are split on their most constrained
+cell, one copy per candidate, and the copies propagated together for a few
+rounds; only the boards still open after that go to Grid.search one at a
+time.
+
+Needs numpy.
+'''
+import sys
+import time
+from array import array
+
+import numpy as np
+
+import puzzleio
+import sudoku
+from sudoku import ALL_VALUES
+
+
+UNIT_INDEX = np.array(sudoku.UNITS, dtype = np.intp)                        # (27, 9)
+CELL_UNITS = np.array([ [ sudoku.UNITS.index(unit) for unit in units ]
+    for units in sudoku.UNITS_FOR_CELL ], dtype = np.intp)                  # (81, 3)
+POPCOUNT = np.frombuffer(sudoku.POPCOUNT, dtype = np.uint8)
+LOWEST_VALUE = np.frombuffer(sudoku.LOWEST_VALUE, dtype = np.uint8)
+
+# values of the status array
+STALLED = 0
+SOLVED = 1
+CONTRADICTION = -1
+
+
+def encode(puzzles):
+    '''
+    Candidate masks for a list of 81 character puzzles; givens become
+    single-candidate masks. Raises ValueError on malformed puzzles.
+    '''
+    text = ''.join(puzzles)
+    if len(text) != 81 * len(puzzles):
+        raise ValueError("Every puzzle must be 81 characters")
+    chars = np.frombuffer(text.encode('ascii'), dtype = np.uint8).reshape(len(puzzles), 81)
+    digits = chars.astype(np.int16) - ord('0')
+    blank = (chars == ord('.')) | (digits == 0)
+    if ((digits < 0) | (digits > 9))[~blank].any():
+        raise ValueError("Invalid grid character")
+    masks = np.left_shift(1, np.clip(digits - 1, 0, 8)).astype(np.uint16)
+    masks[blank] = ALL_VALUES
+    return masks
+
+
+def decode(masks):
+    '''
+    81 character strings for an array of masks, '.' for unsolved cells.
+    '''
+    values = np.where(POPCOUNT[masks] == 1, LOWEST_VALUE[masks], 0).astype(np.uint8)
+    chars = values + ord('0')
+    chars[values == 0] = ord('.')
+    return [ row.tobytes().decode('ascii') for row in chars ]
+
+
+def unit_or(masks):
+    '''
+    OR of each unit's masks: (N, 81) -> (N, 27).
+    '''
+    return np.bitwise_or.reduce(masks[:, UNIT_INDEX], axis = 2)
+
+
+def propagate_step(masks):
+    '''
+    One round of elimination and hidden singles on every board. Returns the
+    new masks and a per-board flag for boards found to be contradictory.
+    '''
+    single = POPCOUNT[masks] == 1
+
+    # eliminate every solved value from the other cells of its units
+    solved_values = np.where(single, masks, 0).astype(np.uint16)
+    solved_by_unit = unit_or(solved_values)                                # (N, 27)
+    taken = np.bitwise_or.reduce(solved_by_unit[:, CELL_UNITS], axis = 2)  # (N, 81)
+    masks = np.where(single, masks, masks & ~taken).astype(np.uint16)
+
+    # two solved cells with the same value in one unit
+    singles_per_unit = single[:, UNIT_INDEX].sum(axis = 2)
+    bad = (POPCOUNT[solved_by_unit] < singles_per_unit).any(axis = 1)
+
+    # hidden singles: values that fit only one cell of a unit
+    cells = masks[:, UNIT_INDEX]                                           # (N, 27, 9)
+    once = np.zeros(cells.shape[:2], dtype = np.uint16)
+    twice = np.zeros(cells.shape[:2], dtype = np.uint16)
+    for k in range(9):
+        twice |= once & cells[:, :, k]
+        once |= cells[:, :, k]
+    bad |= (once != ALL_VALUES).any(axis = 1)
+
+    hidden = (once & ~twice)[:, CELL_UNITS]                                # (N, 81, 3)
+    forced = np.bitwise_or.reduce(hidden & masks[:, :, None], axis = 2).astype(np.uint16)
+    # a cell that is the only place for two different values
+    bad |= (POPCOUNT[forced] > 1).any(axis = 1)
+    masks = np.where(forced != 0, forced, masks).astype(np.uint16)
+
+    bad |= (masks == 0).any(axis = 1)
+    return masks, bad
+
+
+def propagate(masks, max_rounds = 81):
+    '''
+    Run propagate_step to a fixpoint on every board, only revisiting the
+    boards that changed in the last round. Returns the masks and a status
+    per board: SOLVED, CONTRADICTION or STALLED.
+    '''
+    masks = np.array(masks, dtype = np.uint16)
+    status = np.full(len(masks), STALLED, dtype = np.int8)
+    active = np.arange(len(masks))
+
+    for _ in range(max_rounds):
+        if not len(active):
+            break
+        before = masks[active]
+        after, bad = propagate_step(before)
+        masks[active] = after
+        status[active[bad]] = CONTRADICTION
+
+        changed = (after != before).any(axis = 1) & ~bad
+        active = active[changed]
+
+    solved = (POPCOUNT[masks] == 1).all(axis = 1) & (status != CONTRADICTION)
+    status[solved] = SOLVED
+    return masks, status
+
+
+def branch_cells(masks):
+    '''
+    The unsolved cell with the fewest candidates on every board, and its
+    candidates.
+    '''
+    counts = POPCOUNT[masks].astype(np.int8)
+    counts[counts == 1] = 10
+    cell = counts.argmin(axis = 1)
+    return cell, masks[np.arange(len(masks)), cell]
+
+
+def branch(masks, owners, cells = None):
+    '''
+    Split every board on a cell, one child per candidate: the cells
+    branch_cells() picks, unless a (cell, candidates) pair from it is given.
+    Returns the children and the owner of each.
+    '''
+    cell, candidates = branch_cells(masks) if cells is None else cells
+
+    children = []
+    child_owners = []
+    for v in range(9):
+        has = (candidates & (1 << v)) != 0
+        child = masks[has]
+        child[np.arange(len(child)), cell[has]] = 1 << v
+        children.append(child)
+        child_owners.append(owners[has])
+    return np.concatenate(children), np.concatenate(child_owners)
+
+
+def search_board(masks_row, rules = sudoku.DEFAULT_RULES):
+    '''
+    Finish one stalled board with Grid.search. Returns the solution string or
+    None.
+    '''
+    g = sudoku.Grid(rules = rules)
+    g.board.masks = array('H', masks_row.tolist())
+    if g.propagate() and g.search():
+        return g.format_grid()
+    return None
+
+
+def solve_batch(puzzles, rules = sudoku.DEFAULT_RULES, stats = None, branch_rounds = 3, max_boards = 1 << 16):
+    '''
+    Solve a list of puzzles, returning a solution string (or None) for each.
+
+    Stalled boards are branched and propagated together for up to
+    `branch_rounds` rounds, as long as that keeps no more than `max_boards`
+    boards in play. If a `stats` dict is given it gets how many puzzles were
+    solved by propagation alone, by branching, and by Grid.search, and how
+    many had no solution.
+    '''
+    masks, status = propagate(encode(puzzles))
+    results = [ None, ] * len(puzzles)
+    done = np.flatnonzero(status == SOLVED)
+    for i, solution in zip(done, decode(masks[done])):
+        results[i] = solution
+
+    stalled = np.flatnonzero(status == STALLED)
+    open_owners = stalled
+    boards, owners = masks[stalled], stalled
+    branched = 0
+    for _ in range(branch_rounds):
+        if not len(boards):
+            break
+        cells = branch_cells(boards)
+        # each board splits into one child per candidate of its cell
+        if int(POPCOUNT[cells[1]].sum()) > max_boards:
+            break
+        boards, owners = branch(boards, owners, cells)
+        boards, child_status = propagate(boards)
+
+        done = np.flatnonzero(child_status == SOLVED)
+        for k, solution in zip(done, decode(boards[done])):
+            if results[owners[k]] is None:
+                results[owners[k]] = solution
+                branched += 1
+
+        keep = child_status == STALLED
+        keep &= np.array([ results[o] is None for o in owners ], dtype = bool)
+        boards, owners = boards[keep], owners[keep]
+        # puzzles with no stalled children left are solved or have no
+        # solution at all
+        open_owners = np.unique(owners)
+
+    # whatever branching didn't settle goes to the scalar search, starting
+    # again from the propagated board
+    searched = 0
+    for i in open_owners:
+        if results[i] is None:
+            results[i] = search_board(masks[i], rules)
+            searched += 1
+
+    if stats is not None:
+        stats['propagated'] = int((status == SOLVED).sum())
+        stats['branched'] = branched
+        stats['searched'] = searched
+        stats['unsolvable'] = len([ r for r in results if r is None ])
+    return results
+
+
+def solve_stream(puzzles, batch_size = 4096, rules = sudoku.DEFAULT_RULES):
+    '''
+    Solve an iterable of puzzles `batch_size` at a time, yielding
+    (puzzle, solution) pairs in order.
+    '''
+    batch = []
+    for puzzle in puzzles:
+        batch.append(puzzle)
+        if len(batch) == batch_size:
+            for pair in zip(batch, solve_batch(batch, rules)):
+                yield pair
+            batch = []
+    if batch:
+        for pair in zip(batch, solve_batch(batch, rules)):
+            yield pair
+
+
+if __name__ == '__main__':
+    t_start = time.perf_counter()
+    count = 0
+    solved = 0
+    with puzzleio.PuzzleWriter('-') as writer:
+        for puzzle, solution in solve_stream(puzzleio.read_corpora(sys.argv[1:] or ['-'])):
+            writer.write(solution or 'unsolvable')
+            count += 1
+            solved += solution is not None
+    elapsed = time.perf_counter() - t_start
+    sys.stderr.write("%d puzzles in %.2f s (%.0f/s), %d solved\n" % (count, elapsed, count / elapsed, solved))